@@ -0,0 +1,54 @@
+import math
+
+# How many standard deviations of price movement must fit between two polls before the
+# nearest threshold could be reached. Higher values poll more eagerly.
+SAFETY_SIGMAS = 3.0
+# Weight of the newest return in the volatility estimate
+VOLATILITY_SMOOTHING = 0.2
+
+
+class VolatilityTracker:
+    """Exponentially weighted variance of log returns per second for one pair."""
+
+    __slots__ = ('last_price', 'last_time', 'variance')
+
+    def __init__(self):
+        self.last_price = None
+        self.last_time = None
+        self.variance = None # None until two prices have been seen
+
+    def update(self, price: float, now: float):
+        if self.last_price is not None and price > 0 and self.last_price > 0 and now > self.last_time:
+            log_return = math.log(price / self.last_price)
+            sample = log_return * log_return / (now - self.last_time)
+            if self.variance is None:
+                self.variance = sample
+            else:
+                self.variance += VOLATILITY_SMOOTHING * (sample - self.variance)
+        self.last_price = price
+        self.last_time = now
+
+    @property
+    def sigma(self):
+        """Volatility per square root of a second, None if not known yet."""
+        return None if self.variance is None else math.sqrt(self.variance)
+
+
+def adaptive_interval(distance, sigma, min_interval: float, max_interval: float) -> float:
+    """
+    Picks the next poll interval for a pair.
+
+    `distance` is the relative distance from the last price to the nearest threshold
+    (None if the pair has no thresholds), `sigma` the pair's volatility per sqrt second.
+    With a random-walk price, crossing a distance d takes about (d / sigma)^2 seconds, so
+    the interval is the time in which the price could move SAFETY_SIGMAS times less than
+    that, clamped to [min_interval, max_interval].
+    """
+    if distance is None:
+        return max_interval
+    if sigma is None or distance <= 0:
+        return min_interval # Unknown volatility or sitting right on a threshold: stay alert
+    if sigma == 0:
+        return max_interval
+    interval = (distance / (SAFETY_SIGMAS * sigma)) ** 2
+    return min(max_interval, max(min_interval, interval))
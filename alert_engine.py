@@ -0,0 +1,216 @@
+import bisect
+import heapq
+import logging
+
+from move_rules import PairMoveEngine
+
+logger = logging.getLogger(__name__)
+
+
+class PairAlertEngine:
+    """
+    Evaluates every chat's price range on one pair against each new price tick.
+
+    Lower and upper bounds are kept in sorted arrays. A rule can only change between
+    inside and outside if one of its bounds lies between the previous and the new price,
+    so each tick bisects that span instead of checking every rule: O(log n + k).
+    Rules that stay outside are re-alerted through a heap ordered by cooldown expiry.
+
+    Rules are MonitorConfig objects; the engine reads price_lower, price_upper and
+    alert_cooldown and updates last_alert_time exactly like the original per-chat check:
+    alert on leaving the range if the cooldown allows it, alert again every cooldown while
+    outside, and reset the cooldown once the price is back inside.
+
+    Two optional settings per rule change that: with `confirm_ticks` the price has to stay
+    outside for that many consecutive ticks before the first alert, and with `rearm_margin`
+    the cooldown only resets once the price is back inside by that many percent, so a price
+    hovering at a bound does not alert on every crossing. Rules in either state are kept in
+    small sets checked on every tick. Percent-move rules are evaluated by `moves`.
+    """
+
+    def __init__(self):
+        self._rules = {}        # chat id -> MonitorConfig
+        self._bounds = {}       # chat id -> (lower, upper) as indexed, so changed configs can be re-indexed
+        self._outside = {}      # chat id -> whether the rule was outside at the last price
+        self._pending = set()   # chat ids added or changed since the last tick, evaluated in full
+        self._lower_bounds = [] # sorted lower thresholds
+        self._lower_ids = []    # chat ids, parallel to _lower_bounds
+        self._upper_bounds = [] # sorted upper thresholds (rules without an upper limit are left out)
+        self._upper_ids = []    # chat ids, parallel to _upper_bounds
+        self._cooldowns = []    # heap of (cooldown expiry, chat id) for rules outside their range
+        self._confirming = {}   # chat id -> consecutive ticks outside so far, for rules awaiting confirmation
+        self._rearming = set()  # chat ids back inside their range but not yet past the re-arm margin
+        self.moves = PairMoveEngine()
+        self.last_price = None
+        self.suppressed = 0     # alerts held back by a cooldown on the last tick
+        self.move_alerts = []   # (config, change percent, reference price) of the move rules that fired on the last tick
+
+    def __len__(self):
+        return len(self._rules)
+
+    def add(self, config):
+        """Adds a chat's rule, or re-indexes it after its range changed. Its state is evaluated in full on the next tick."""
+        if config.chat_id in self._rules:
+            self.remove(config.chat_id)
+        self._rules[config.chat_id] = config
+        self._bounds[config.chat_id] = (config.price_lower, config.price_upper)
+        self._pending.add(config.chat_id)
+        self._insert(self._lower_bounds, self._lower_ids, config.price_lower, config.chat_id)
+        if config.price_upper is not None:
+            self._insert(self._upper_bounds, self._upper_ids, config.price_upper, config.chat_id)
+        self.moves.add(config)
+
+    def remove(self, chat_id: int):
+        if self._rules.pop(chat_id, None) is None:
+            return
+        lower, upper = self._bounds.pop(chat_id)
+        self._outside.pop(chat_id, None)
+        self._pending.discard(chat_id)
+        self._confirming.pop(chat_id, None)
+        self._rearming.discard(chat_id)
+        self.moves.remove(chat_id)
+        self._delete(self._lower_bounds, self._lower_ids, lower, chat_id)
+        if upper is not None:
+            self._delete(self._upper_bounds, self._upper_ids, upper, chat_id)
+        # Stale heap entries are skipped when popped
+
+    @staticmethod
+    def _insert(bounds: list, ids: list, bound: float, chat_id: int):
+        index = bisect.bisect_right(bounds, bound)
+        bounds.insert(index, bound)
+        ids.insert(index, chat_id)
+
+    @staticmethod
+    def _delete(bounds: list, ids: list, bound: float, chat_id: int):
+        index = bisect.bisect_left(bounds, bound)
+        while index < len(bounds) and bounds[index] == bound:
+            if ids[index] == chat_id:
+                del bounds[index]
+                del ids[index]
+                return
+            index += 1
+
+    @staticmethod
+    def is_outside(config, price: float) -> bool:
+        # An upper threshold of None means only drops below the lower threshold are alerted
+        return price < config.price_lower or (config.price_upper is not None and price > config.price_upper)
+
+    @staticmethod
+    def is_rearmed(config, price: float) -> bool:
+        """Whether the price is far enough inside the range to reset the cooldown."""
+        if not config.rearm_margin:
+            return not PairAlertEngine.is_outside(config, price)
+        factor = config.rearm_margin / 100
+        return price >= config.price_lower * (1 + factor) and \
+            (config.price_upper is None or price <= config.price_upper * (1 - factor))
+
+    def _candidates(self, old_price: float, new_price: float) -> set:
+        """Chat ids with a bound between the previous and the new price."""
+        low, high = min(old_price, new_price), max(old_price, new_price)
+        # price < lower flips for lowers in (low, high]; price > upper flips for uppers in [low, high)
+        start = bisect.bisect_right(self._lower_bounds, low)
+        end = bisect.bisect_right(self._lower_bounds, high)
+        candidates = set(self._lower_ids[start:end])
+        start = bisect.bisect_left(self._upper_bounds, low)
+        end = bisect.bisect_left(self._upper_bounds, high)
+        candidates.update(self._upper_ids[start:end])
+        return candidates
+
+    def nearest_threshold_distance(self, price: float):
+        """Relative distance from a price to the closest lower or upper threshold, None without rules."""
+        nearest = None
+        for bounds in (self._lower_bounds, self._upper_bounds):
+            index = bisect.bisect_left(bounds, price)
+            for neighbour in bounds[max(index - 1, 0):index + 1]:
+                distance = abs(neighbour - price)
+                if nearest is None or distance < nearest:
+                    nearest = distance
+        if nearest is None or price <= 0:
+            return None
+        return nearest / price
+
+    def evaluate(self, price: float, now: float) -> tuple:
+        """
+        Feeds a new price. Returns (alerts, resets): the configs that should be alerted now and
+        the configs whose cooldown was reset because the price is back inside their range.
+        """
+        if self.last_price is None:
+            candidates = set(self._rules)
+        else:
+            candidates = self._candidates(self.last_price, price)
+            candidates.update(self._pending)
+        self._pending.clear()
+        self.last_price = price
+        self.suppressed = 0
+
+        alerts = []
+        resets = []
+        checked = set() # Rules whose cooldown was already checked on this tick
+        for chat_id in candidates:
+            config = self._rules[chat_id]
+            outside = self.is_outside(config, price)
+            was_outside = self._outside.get(chat_id)
+            self._outside[chat_id] = outside
+            if outside:
+                self._rearming.discard(chat_id)
+                if was_outside:
+                    continue # Still outside, re-alerts come from the cooldown heap
+                checked.add(chat_id)
+                if (config.confirm_ticks or 1) > 1:
+                    self._confirming[chat_id] = 1
+                elif self._alert_if_allowed(config, now):
+                    alerts.append(config)
+            else:
+                self._confirming.pop(chat_id, None)
+                if config.last_alert_time is not None:
+                    self._rearming.add(chat_id)
+
+        # Rules still outside count another tick towards their confirmation
+        for chat_id, ticks in list(self._confirming.items()):
+            if chat_id not in checked:
+                ticks += 1
+                checked.add(chat_id)
+            config = self._rules[chat_id]
+            if ticks < config.confirm_ticks:
+                self._confirming[chat_id] = ticks
+                continue
+            del self._confirming[chat_id]
+            if self._alert_if_allowed(config, now):
+                alerts.append(config)
+
+        # Rules back inside reset their cooldown once past the re-arm margin
+        for chat_id in list(self._rearming):
+            config = self._rules[chat_id]
+            if config.last_alert_time is None:
+                self._rearming.discard(chat_id)
+            elif self.is_rearmed(config, price):
+                self._rearming.discard(chat_id)
+                logger.info(f"Price is back inside the range of chat {chat_id}. Resetting alert cooldown.")
+                config.last_alert_time = None
+                resets.append(config)
+
+        # Rules that stayed outside whose cooldown has run out
+        while self._cooldowns and self._cooldowns[0][0] < now:
+            _, chat_id = heapq.heappop(self._cooldowns)
+            config = self._rules.get(chat_id)
+            if config is None or not self._outside.get(chat_id) or chat_id in checked or chat_id in self._confirming:
+                continue
+            checked.add(chat_id)
+            if self._alert_if_allowed(config, now):
+                alerts.append(config)
+
+        self.move_alerts = self.moves.evaluate(price, now)
+        self.suppressed += self.moves.suppressed
+        return alerts, resets
+
+    def _alert_if_allowed(self, config, now: float) -> bool:
+        """Marks the rule as alerted unless it is in cooldown, in which case its expiry is queued."""
+        if config.last_alert_time is None or (now - config.last_alert_time) > config.alert_cooldown:
+            config.last_alert_time = now
+            heapq.heappush(self._cooldowns, (now + config.alert_cooldown, config.chat_id))
+            return True
+        self.suppressed += 1
+        remaining = config.alert_cooldown - (now - config.last_alert_time)
+        logger.info(f"Price out of range for chat {config.chat_id}, but still in cooldown period ({remaining / 60:.1f} minutes remaining).")
+        heapq.heappush(self._cooldowns, (config.last_alert_time + config.alert_cooldown, config.chat_id))
+        return False
@@ -0,0 +1,114 @@
+import hashlib
+import heapq
+import logging
+
+from adaptive_interval import VolatilityTracker, adaptive_interval
+
+logger = logging.getLogger(__name__)
+
+# Dexscreener's /latest/dex/pairs/{chain}/{a,b,...} lookup accepts at most 30 addresses per call
+MAX_PAIRS_PER_REQUEST = 30
+
+
+def stagger_offset(key: tuple, interval: float) -> float:
+    """
+    Offset in [0, interval) for a pair's first poll. It derives from the pair alone, so the
+    pairs restored together at startup spread evenly across one interval, and each pair
+    keeps its place across restarts.
+    """
+    digest = hashlib.blake2b(f"{key[0]}:{key[1]}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64 * interval
+
+
+class BatchScheduler:
+    """
+    Keeps a heap of when each watched pair is next due and hands out the due pairs of a
+    time window grouped by chain and split into chunks for Dexscreener's multi-pair lookup.
+
+    Each pair's interval adapts to how close its last price is to the nearest threshold and
+    to its recent volatility, clamped to the [min, max] interval its chats asked for.
+    It only does the bookkeeping; the bot drives it from a repeating job, fetches the
+    chunks, dispatches the results and reports each new price through `record_price`.
+    """
+
+    def __init__(self, window_seconds: float, chunk_size: int = MAX_PAIRS_PER_REQUEST):
+        self.window_seconds = window_seconds
+        self.chunk_size = chunk_size
+        self._heap = []         # (due timestamp, (chain_id, pair_address)); stale entries are skipped
+        self._next_due = {}     # (chain_id, pair_address) -> timestamp of the next poll
+        self._bounds = {}       # (chain_id, pair_address) -> (min interval, max interval)
+        self._intervals = {}    # (chain_id, pair_address) -> currently chosen interval
+        self._volatility = {}   # (chain_id, pair_address) -> VolatilityTracker
+
+    def schedule(self, key: tuple, min_interval: float, max_interval: float, now: float, first: float = 0):
+        """Starts polling a pair, or changes its interval bounds. The first poll happens `first` seconds from now."""
+        bounds = (min_interval, max_interval)
+        if self._bounds.get(key) == bounds and key in self._next_due:
+            return
+        self._bounds[key] = bounds
+        self._intervals[key] = min_interval # Stay alert until there is a price to adapt to
+        self._volatility.setdefault(key, VolatilityTracker())
+        self._set_due(key, now + first)
+
+    def unschedule(self, key: tuple):
+        self._bounds.pop(key, None)
+        self._intervals.pop(key, None)
+        self._next_due.pop(key, None)
+        self._volatility.pop(key, None)
+
+    def _set_due(self, key: tuple, due: float):
+        self._next_due[key] = due
+        heapq.heappush(self._heap, (due, key))
+
+    def is_scheduled(self, key: tuple) -> bool:
+        return key in self._next_due
+
+    def interval_for(self, key: tuple):
+        """The interval currently chosen for a pair, None if it is not polled."""
+        return self._intervals.get(key)
+
+    def __len__(self):
+        return len(self._next_due)
+
+    def record_price(self, key: tuple, price: float, threshold_distance, now: float) -> float:
+        """
+        Adapts a pair's interval to a freshly fetched price and the relative distance to its
+        nearest threshold (None if it has none). Returns the chosen interval.
+        """
+        if key not in self._bounds:
+            return None
+        tracker = self._volatility[key]
+        tracker.update(price, now)
+        min_interval, max_interval = self._bounds[key]
+        interval = adaptive_interval(threshold_distance, tracker.sigma, min_interval, max_interval)
+        self._intervals[key] = interval
+        self._set_due(key, now + interval)
+        return interval
+
+    def take_due(self, now: float) -> list:
+        """
+        Pops every pair due before the end of the current window and returns
+        [(chain_id, [pair_address, ...]), ...] chunks. Until `record_price` reports the
+        result, a taken pair is due again after its current interval, so failed fetches retry.
+        """
+        horizon = now + self.window_seconds
+        by_chain = {}
+        while self._heap and self._heap[0][0] <= horizon:
+            due, key = heapq.heappop(self._heap)
+            if self._next_due.get(key) != due:
+                continue # Rescheduled or unscheduled since this entry was pushed
+            by_chain.setdefault(key[0], []).append(key[1])
+            self._set_due(key, max(due, now) + self._intervals[key])
+
+        chunks = []
+        for chain_id, addresses in by_chain.items():
+            for i in range(0, len(addresses), self.chunk_size):
+                chunks.append((chain_id, addresses[i:i + self.chunk_size]))
+        return chunks
+
+    def chunk_delays(self, chunk_count: int) -> list:
+        """Start offsets that spread `chunk_count` requests evenly across the window."""
+        if chunk_count <= 1:
+            return [0.0] * chunk_count
+        step = self.window_seconds / chunk_count
+        return [i * step for i in range(chunk_count)]
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+
+class Excursion:
+    """One scripted move of a pair out of its band: from `start` to `end` seconds after the walk started."""
+
+    __slots__ = ('pair_index', 'start', 'end', 'move')
+
+    def __init__(self, pair_index: int, start: float, end: float, move: float):
+        self.pair_index = pair_index
+        self.start = start
+        self.end = end
+        self.move = move # Relative to the center price, e.g. -0.03 for 3% below
+
+
+def periodic_excursions(pair_count: int, every: float, length: float, size: float,
+                        duration: float, first_at: float = 5, settle: float = 10) -> list:
+    """
+    Every pair leaves its band for `length` seconds once per `every` seconds, alternating
+    below and above. Pairs are staggered across the period so alerts do not all fire at once.
+    Nothing starts later than `settle` seconds before the end, so its alerts can still arrive.
+    """
+    excursions = []
+    for pair_index in range(pair_count):
+        start = first_at + every * pair_index / pair_count
+        k = 0
+        while start + length + settle <= duration:
+            excursions.append(Excursion(pair_index, start, start + length, size if k % 2 else -size))
+            start += every
+            k += 1
+    return excursions
+
+
+def load_excursions(path: str, pair_count: int) -> list:
+    """
+    Reads a scripted walk: {"excursions": [{"pair": 0 or "*", "at": 10, "duration": 20, "move": -0.03}, ...]}.
+    """
+    with open(path) as f:
+        script = json.load(f)
+    excursions = []
+    for entry in script["excursions"]:
+        pairs = range(pair_count) if entry["pair"] == "*" else [int(entry["pair"])]
+        for pair_index in pairs:
+            start = float(entry["at"])
+            excursions.append(Excursion(pair_index, start, start + float(entry["duration"]), float(entry["move"])))
+    return excursions
+
+
+class PriceWalk:
+    """
+    Deterministic price of every bench pair over time: a mean-reverting random walk that stays
+    within +-`noise` of the center, plus scripted excursions. Before `start` every pair sits at
+    the center, so chats can be set up without alerts firing.
+    """
+
+    def __init__(self, pair_count: int, excursions, center: float = 1.0, noise: float = 0.002,
+                 step_seconds: float = 1.0, seed: int = 1):
+        self.center = center
+        self.noise = noise
+        self.step_seconds = step_seconds
+        self.t0 = None
+        self._rng = random.Random(seed)
+        self._offsets = [0.0] * pair_count
+        self._steps = 0
+        self.excursions = {pair_index: [] for pair_index in range(pair_count)}
+        for excursion in sorted(excursions, key=lambda e: e.start):
+            self.excursions[excursion.pair_index].append(excursion)
+
+    def start(self):
+        self.t0 = time.monotonic()
+
+    def elapsed(self, now: float = None) -> float:
+        if self.t0 is None:
+            return 0.0
+        return (time.monotonic() if now is None else now) - self.t0
+
+    def _advance(self, t: float):
+        while self._steps * self.step_seconds < t:
+            for i, offset in enumerate(self._offsets):
+                offset = 0.9 * offset + self._rng.gauss(0, self.noise / 3)
+                self._offsets[i] = max(-self.noise, min(self.noise, offset))
+            self._steps += 1
+
+    def active_excursion(self, pair_index: int, t: float):
+        for excursion in self.excursions[pair_index]:
+            if excursion.start > t:
+                break
+            if t < excursion.end:
+                return excursion
+        return None
+
+    def price(self, pair_index: int, now: float = None) -> float:
+        if self.t0 is None:
+            return self.center
+        t = self.elapsed(now)
+        self._advance(t)
+        excursion = self.active_excursion(pair_index, t)
+        move = excursion.move if excursion is not None else 0.0
+        return self.center * (1 + self._offsets[pair_index] + move)
+
+
+def pair_address(pair_index: int) -> str:
+    return f"0x{pair_index + 1:040x}"
+
+
+class FakeDexscreener:
+    """
+    Stand-in for the Dexscreener pairs API (/latest/dex/pairs/{chain}/{a,b,...}) serving the
+    prices of a PriceWalk for every requested address. Latency, error rate and a requests-per-minute limit are configurable.
+    """
+
+    def __init__(self, walk: PriceWalk, latency: float = 0.05, jitter: float = 0.05,
+                 error_rate: float = 0.0, rate_limit: int = 0, seed: int = 2):
+        self.walk = walk
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit # Requests per minute, 0 for unlimited
+        self._rng = random.Random(seed)
+        self._recent = [] # Request times within the last minute, for the rate limit
+        self._pair_indexes = {pair_address(i).lower(): i for i in range(len(walk.excursions))}
+        self.requests = 0
+        self.pairs_served = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self._runner = None
+        self.port = None
+
+    def _pair_json(self, chain_id: str, address: str, pair_index) -> dict:
+        # Addresses outside the walk (e.g. the bot's default pair) are served at a flat center price
+        price = self.walk.price(pair_index) if pair_index is not None else self.walk.center
+        return {
+            "chainId": chain_id,
+            "dexId": "benchswap",
+            "url": f"https://dexscreener.com/{chain_id}/{address}",
+            "pairAddress": address,
+            "baseToken": {"address": address, "name": f"Bench {address[-6:]}", "symbol": f"B{address[-6:]}"},
+            "quoteToken": {"address": "0x" + "f" * 40, "name": "Bench Quote", "symbol": "BQ"},
+            "priceNative": f"{price:.8f}",
+            "priceUsd": f"{price:.8f}",
+            "txns": {period: {"buys": 0, "sells": 0} for period in ("m5", "h1", "h6", "h24")},
+            "volume": {"m5": 0, "h1": 0, "h6": 0, "h24": 0},
+            "priceChange": {"m5": 0, "h1": 0, "h6": 0, "h24": 0},
+        }
+
+    async def _pairs(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        now = time.monotonic()
+        if self.rate_limit:
+            self._recent = [t for t in self._recent if now - t < 60]
+            if len(self._recent) >= self.rate_limit:
+                self.rate_limited += 1
+                return web.Response(status=429, text="Too Many Requests")
+            self._recent.append(now)
+
+        await asyncio.sleep(max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)))
+        if self._rng.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=500, text="Internal Server Error")
+
+        chain_id = request.match_info["chain"]
+        pairs = []
+        for address in request.match_info["addresses"].split(","):
+            pairs.append(self._pair_json(chain_id, address, self._pair_indexes.get(address.lower())))
+        self.pairs_served += len(pairs)
+        return web.json_response({"schemaVersion": "1.0.0", "pairs": pairs, "pair": pairs[0] if pairs else None})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get("/latest/dex/pairs/{chain}/{addresses}", self._pairs)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return f"http://{host}:{self.port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,180 @@
+import asyncio
+import itertools
+import math
+import random
+
+from aiohttp import WSMsgType, web
+
+from fake_dexscreener import PriceWalk, pair_address
+
+# Same constants as pool_events.py, spelled out so the stand-in does not depend on the bot
+SYNC_V2_TOPIC = "0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1"
+SWAP_V3_TOPIC = "0xc42079f94a6350d7e6235f29174924f928cc2ac818eb64fed8004e115fbcca67"
+TOKEN0_SELECTOR = "0x0dfe1681"
+TOKEN1_SELECTOR = "0xd21220a7"
+DECIMALS_SELECTOR = "0x313ce567"
+
+QUOTE_TOKEN = "0x" + "f" * 40 # fake_dexscreener's quote token
+BASE_DECIMALS = 18
+QUOTE_DECIMALS = 6
+BASE_RESERVE = 10 ** 6 # Whole base tokens in every constant-product pool
+
+
+def _word(value: int) -> str:
+    return f"{value:064x}"
+
+
+class FakePool:
+    """
+    One bench pair as an on-chain pool. Pairs cycle through three layouts so every price
+    path of the bot gets exercised: a constant-product pool with the base token as token0,
+    one with it as token1, and a concentrated-liquidity pool emitting Swap events.
+    """
+
+    __slots__ = ('address', 'pair_index', 'kind', 'token0', 'token1')
+
+    def __init__(self, pair_index: int):
+        self.address = pair_address(pair_index)
+        self.pair_index = pair_index
+        self.kind = ("v2", "v2", "v3")[pair_index % 3]
+        base = self.address # fake_dexscreener uses the pair address as the base token
+        self.token0, self.token1 = (QUOTE_TOKEN, base) if pair_index % 3 == 1 else (base, QUOTE_TOKEN)
+
+    def decimals(self, token: str) -> int:
+        return QUOTE_DECIMALS if token == QUOTE_TOKEN else BASE_DECIMALS
+
+    def log(self, price: float, block: int) -> dict:
+        """A Sync or Swap log moving the pool to `price` (base token in quote token)."""
+        base_is_token0 = self.token0 != QUOTE_TOKEN
+        price0 = price if base_is_token0 else 1 / price # token0 in token1
+        decimals0, decimals1 = self.decimals(self.token0), self.decimals(self.token1)
+        if self.kind == "v3":
+            sqrt_price_x96 = int(math.sqrt(price0 * 10 ** (decimals1 - decimals0)) * 2 ** 96)
+            topic = SWAP_V3_TOPIC
+            data = _word(0) + _word(0) + _word(sqrt_price_x96) + _word(10 ** 20) + _word(0)
+        else:
+            reserve0 = BASE_RESERVE if base_is_token0 else BASE_RESERVE * price
+            reserve1 = reserve0 * price0
+            topic = SYNC_V2_TOPIC
+            data = _word(int(reserve0 * 10 ** decimals0)) + _word(int(reserve1 * 10 ** decimals1))
+        return {
+            "address": self.address,
+            "topics": [topic],
+            "data": "0x" + data,
+            "blockNumber": hex(block),
+            "removed": False,
+        }
+
+
+class FakeRpc:
+    """
+    Stand-in for an EVM JSON-RPC websocket (eth_call, eth_subscribe/eth_unsubscribe "logs")
+    serving the pools of a PriceWalk. Every `tick` seconds each subscribed pool whose price
+    changed emits a log. With `drop_every` set, all connections are closed that often to
+    exercise the bot's fallback to polling.
+    """
+
+    def __init__(self, walk: PriceWalk, tick: float = 0.1, drop_every: float = 0, seed: int = 3):
+        self.walk = walk
+        self.tick = tick
+        self.drop_every = drop_every
+        self._rng = random.Random(seed)
+        self.pools = {pool.address: pool for pool in map(FakePool, range(len(walk.excursions)))}
+        self._tokens = {token for pool in self.pools.values() for token in (pool.token0, pool.token1)}
+        self._subscription_ids = itertools.count(1)
+        self._sockets = set()
+        self._block = 1
+        self.connections = 0
+        self.events = 0
+        self.drops = 0
+        self._runner = None
+        self._dropper = None
+        self.port = None
+
+    def _call(self, call: dict):
+        to, selector = call.get("to", "").lower(), call.get("data", "")[:10]
+        pool = self.pools.get(to)
+        if pool is not None and selector == TOKEN0_SELECTOR:
+            return "0x" + _word(int(pool.token0, 16))
+        if pool is not None and selector == TOKEN1_SELECTOR:
+            return "0x" + _word(int(pool.token1, 16))
+        if to in self._tokens and selector == DECIMALS_SELECTOR:
+            return "0x" + _word(QUOTE_DECIMALS if to == QUOTE_TOKEN else BASE_DECIMALS)
+        return None # Reverts, e.g. stable() on these plain pools
+
+    async def _emit(self, ws: web.WebSocketResponse, subscriptions: dict):
+        last_prices = {}
+        while not ws.closed:
+            for subscription, pool in list(subscriptions.items()):
+                price = self.walk.price(pool.pair_index)
+                if last_prices.get(subscription) == price:
+                    continue
+                last_prices[subscription] = price
+                self._block += 1
+                await ws.send_json({"jsonrpc": "2.0", "method": "eth_subscription",
+                                    "params": {"subscription": subscription, "result": pool.log(price, self._block)}})
+                self.events += 1
+            await asyncio.sleep(self.tick)
+
+    async def _socket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        self._sockets.add(ws)
+        subscriptions = {} # subscription id -> FakePool
+        emitter = asyncio.create_task(self._emit(ws, subscriptions))
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                request_json = message.json()
+                method, params = request_json.get("method"), request_json.get("params") or []
+                response = {"jsonrpc": "2.0", "id": request_json.get("id")}
+                if method == "eth_chainId":
+                    response["result"] = "0xa86a"
+                elif method == "eth_call":
+                    result = self._call(params[0])
+                    if result is None:
+                        response["error"] = {"code": -32000, "message": "execution reverted"}
+                    else:
+                        response["result"] = result
+                elif method == "eth_subscribe" and params[0] == "logs" and params[1].get("address", "").lower() in self.pools:
+                    subscription = hex(next(self._subscription_ids))
+                    subscriptions[subscription] = self.pools[params[1]["address"].lower()]
+                    response["result"] = subscription
+                elif method == "eth_unsubscribe":
+                    response["result"] = subscriptions.pop(params[0], None) is not None
+                else:
+                    response["error"] = {"code": -32601, "message": f"unsupported: {method}"}
+                await ws.send_json(response)
+        finally:
+            emitter.cancel()
+            self._sockets.discard(ws)
+        return ws
+
+    async def _drop_connections(self):
+        while True:
+            await asyncio.sleep(self.drop_every * self._rng.uniform(0.5, 1.5))
+            for ws in list(self._sockets):
+                await ws.close()
+            self.drops += 1
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get("/", self._socket)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        if self.drop_every:
+            self._dropper = asyncio.create_task(self._drop_connections())
+        return f"ws://{host}:{self.port}/"
+
+    async def stop(self):
+        if self._dropper is not None:
+            self._dropper.cancel()
+        for ws in list(self._sockets):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,168 @@
+import asyncio
+import random
+import time
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot",
+            "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False}
+
+
+class _Bucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """Takes a token; returns 0 on success, otherwise the seconds until one is available."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class FakeTelegram:
+    """
+    Stand-in for the Telegram Bot API: answers getMe/deleteWebhook, hands out updates pushed by
+    the driver through long-polled getUpdates and records every sendMessage.
+
+    Flood control works like Telegram's: sends beyond `global_rate` per second or `chat_rate`
+    per second per chat (bursting to `chat_burst`) get a 429 with retry_after. On top of that
+    `error_rate` and `flood_rate` inject random 500s and 429s.
+    """
+
+    def __init__(self, token: str, latency: float = 0.02, error_rate: float = 0.0, flood_rate: float = 0.0,
+                 global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 5, seed: int = 3):
+        self.token = token
+        self.latency = latency
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._rng = random.Random(seed)
+        self._global_bucket = _Bucket(global_rate, global_rate)
+        self._chat_buckets = {}
+        self._updates = []
+        self._update_id = 0
+        self._message_id = 0
+        self._new_updates = asyncio.Event()
+        self.polling = asyncio.Event() # Set on the bot's first getUpdates, i.e. once it finished starting
+        self.on_message = None # callable (monotonic time, chat id, text)
+        self.sent = 0
+        self.errors = 0
+        self.flood_limited = 0
+        self._runner = None
+        self.port = None
+
+    def push_update(self, chat_id: int, text: str):
+        """Queues a private message from `chat_id` for the bot's next getUpdates."""
+        self._update_id += 1
+        self._message_id += 1
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": f"Chat {chat_id}"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"Chat {chat_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        self._updates.append({"update_id": self._update_id, "message": message})
+        self._new_updates.set()
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def _error(code: int, description: str, retry_after: float = None) -> web.Response:
+        body = {"ok": False, "error_code": code, "description": description}
+        if retry_after is not None:
+            body["parameters"] = {"retry_after": retry_after}
+        return web.json_response(body, status=code)
+
+    @staticmethod
+    async def _params(request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        return dict(await request.post())
+
+    async def _method(self, request: web.Request) -> web.Response:
+        if request.match_info["token"] != self.token:
+            return self._error(401, "Unauthorized")
+        method = request.match_info["method"]
+        params = await self._params(request)
+        if method == "getMe":
+            return self._ok(BOT_USER)
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method == "sendMessage":
+            return await self._send_message(params)
+        return self._ok(True) # deleteWebhook, setMyCommands, close, ...
+
+    async def _get_updates(self, params: dict) -> web.Response:
+        self.polling.set()
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit") or 100)
+        return self._ok(self._updates[:limit])
+
+    async def _send_message(self, params: dict) -> web.Response:
+        chat_id = int(params["chat_id"])
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        if self._rng.random() < self.error_rate:
+            self.errors += 1
+            return self._error(500, "Internal Server Error")
+
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = _Bucket(self.chat_rate, self.chat_burst)
+        wait = self._global_bucket.take(now) or bucket.take(now)
+        if wait or self._rng.random() < self.flood_rate:
+            self.flood_limited += 1
+            retry_after = max(1, round(wait))
+            return self._error(429, f"Too Many Requests: retry after {retry_after}", retry_after)
+
+        self.sent += 1
+        self._message_id += 1
+        text = params["text"]
+        if self.on_message is not None:
+            self.on_message(now, chat_id, text)
+        return self._ok({
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": f"Chat {chat_id}"},
+            "from": BOT_USER,
+            "text": text,
+        })
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Starts the server and returns the base URL to give the bot (the token is appended to it)."""
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self._method)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return f"http://{host}:{self.port}/bot"
+
+    async def stop(self):
+        self._new_updates.set() # Release a pending long poll
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,358 @@
+"""
+Load test for blackhole-bot.py against local stand-ins of Dexscreener and the Telegram Bot API.
+
+    python bench/run.py --chats 200 --pairs 40 --duration 120
+
+Starts both fake servers, launches the bot as a subprocess pointed at them, lets N chats
+configure a monitor through getUpdates (/setrange, /setinterval, /setpair, /start) and then
+walks the pair prices, pushing each pair out of its chats' range at scripted times. Reports
+setup and steady-state throughput, alert latency from the price leaving the range to the
+alert reaching the fake Telegram API, and the bot's CPU time and RSS. Runs fully offline.
+
+Exits with status 1 if any --max-*/--min-* gate is missed, so it can guard against regressions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fake_dexscreener import FakeDexscreener, PriceWalk, load_excursions, pair_address, periodic_excursions
+from fake_rpc import FakeRpc
+from fake_telegram import FakeTelegram
+
+BOT_SCRIPT = Path(__file__).resolve().parent.parent / "blackhole-bot.py"
+BOT_TOKEN = "123456:bench"
+FIRST_CHAT_ID = 1000
+GREETING = "I'm now monitoring"
+ALERT = "PRICE ALERT"
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ProcessSampler:
+    """Samples CPU time and RSS of a process from /proc (Linux); reports None elsewhere."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.ticks_per_second = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self.rss_mb = None
+        self.peak_rss_mb = None
+        self._task = None
+
+    def cpu_seconds(self):
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+        return (int(fields[11]) + int(fields[12])) / self.ticks_per_second # utime + stime
+
+    def _sample_memory(self):
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        self.rss_mb = int(line.split()[1]) / 1024
+                    elif line.startswith("VmHWM:"):
+                        self.peak_rss_mb = int(line.split()[1]) / 1024
+        except OSError:
+            pass
+
+    async def _run(self):
+        while True:
+            self._sample_memory()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self._sample_memory()
+        if self._task is not None:
+            self._task.cancel()
+
+
+class Recorder:
+    """Follows the messages the bot delivers: setup acknowledgements and alert latencies."""
+
+    def __init__(self, chat_pairs: dict, walk: PriceWalk, greetings_per_chat: int):
+        self.chat_pairs = chat_pairs # chat id -> pair index
+        self.walk = walk
+        self.greetings_per_chat = greetings_per_chat
+        self.greetings = {}
+        self.configured = asyncio.Event()
+        self._configured_count = 0
+        self.alerted = set() # (chat id, excursion start) already alerted
+        self.latencies = []
+        self.alerts = 0
+        self.extra_alerts = 0 # Alerts outside excursions or repeated within one (cooldown re-alerts)
+
+    def on_message(self, now: float, chat_id: int, text: str):
+        if GREETING in text:
+            count = self.greetings[chat_id] = self.greetings.get(chat_id, 0) + 1
+            if count == self.greetings_per_chat:
+                self._configured_count += 1
+                if self._configured_count == len(self.chat_pairs):
+                    self.configured.set()
+        alerts = text.count(ALERT) # Queued alerts may arrive merged into one message
+        if not alerts:
+            return
+        self.alerts += alerts
+        t = self.walk.elapsed(now)
+        excursion = None
+        for candidate in self.walk.excursions.get(self.chat_pairs.get(chat_id), ()):
+            if candidate.start > t:
+                break
+            excursion = candidate
+        if self.walk.t0 is None or excursion is None or (chat_id, excursion.start) in self.alerted:
+            self.extra_alerts += alerts
+            return
+        self.alerted.add((chat_id, excursion.start))
+        self.latencies.append(t - excursion.start)
+        self.extra_alerts += alerts - 1
+
+    def expected_alerts(self) -> int:
+        return sum(len(self.walk.excursions[pair_index]) for pair_index in self.chat_pairs.values())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chats", type=int, default=100, help="Number of simulated chats.")
+    parser.add_argument("--pairs", type=int, default=20, help="Number of distinct pairs the chats are spread over.")
+    parser.add_argument("--duration", type=float, default=120, help="Seconds of price walk after all chats are set up.")
+    parser.add_argument("--interval", default="5", help="Check interval each chat sets, e.g. 5 or '5 - 30'. Empty to keep the default.")
+    parser.add_argument("--band", type=float, default=0.01, help="Relative half-width of every chat's range around the center price.")
+    parser.add_argument("--noise", type=float, default=0.002, help="Relative amplitude of the in-range random walk.")
+    parser.add_argument("--excursion-every", type=float, default=40, help="Seconds between a pair's excursions out of range.")
+    parser.add_argument("--excursion-length", type=float, default=20, help="Seconds a pair stays out of range.")
+    parser.add_argument("--excursion-size", type=float, default=0.03, help="Relative size of an excursion.")
+    parser.add_argument("--script", help="JSON price script replacing the periodic excursions (see fake_dexscreener.load_excursions).")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dex-latency", type=float, default=0.05, help="Mean Dexscreener response time in seconds.")
+    parser.add_argument("--dex-jitter", type=float, default=0.05, help="Uniform jitter added to the Dexscreener response time.")
+    parser.add_argument("--dex-error-rate", type=float, default=0.0, help="Fraction of Dexscreener requests answered with a 500.")
+    parser.add_argument("--dex-rate-limit", type=int, default=0, help="Dexscreener requests per minute before 429s, 0 for unlimited.")
+    parser.add_argument("--tg-latency", type=float, default=0.02, help="Telegram sendMessage response time in seconds.")
+    parser.add_argument("--tg-error-rate", type=float, default=0.0, help="Fraction of sendMessage calls answered with a 500.")
+    parser.add_argument("--tg-flood-rate", type=float, default=0.0, help="Fraction of sendMessage calls answered with a random 429.")
+    parser.add_argument("--tg-global-rate", type=float, default=30, help="Messages per second before Telegram answers 429.")
+    parser.add_argument("--tg-chat-rate", type=float, default=1, help="Messages per second per chat before Telegram answers 429.")
+    parser.add_argument("--tg-chat-burst", type=float, default=5, help="Burst allowance per chat.")
+    parser.add_argument("--rpc", action="store_true", help="Also serve the pairs as pools over a JSON-RPC websocket (EVM_RPC_WS_URLS).")
+    parser.add_argument("--rpc-tick", type=float, default=0.1, help="Seconds between pool events of a pair whose price changed.")
+    parser.add_argument("--rpc-drop-every", type=float, default=0, help="Close the RPC websockets about this often, 0 to keep them up.")
+    parser.add_argument("--setup-timeout", type=float, default=600, help="Give up if the chats are not set up after this many seconds.")
+    parser.add_argument("--bot-log", help="Where to write the bot's output (default: a temporary file).")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this file.")
+    parser.add_argument("--max-alert-p95", type=float, help="Gate: maximum p95 alert latency in seconds.")
+    parser.add_argument("--max-rss-mb", type=float, help="Gate: maximum peak RSS of the bot in MB.")
+    parser.add_argument("--max-cpu-percent", type=float, help="Gate: maximum steady-state CPU use of the bot, percent of one core.")
+    parser.add_argument("--min-delivery", type=float, help="Gate: minimum fraction of expected alerts that were delivered.")
+    return parser.parse_args()
+
+
+def setup_commands(args, pair_index: int) -> list:
+    center = 1.0
+    commands = ["/setrange", f"{center * (1 - args.band):.6f} - {center * (1 + args.band):.6f}"]
+    if args.interval:
+        commands += ["/setinterval", args.interval]
+    commands += ["/setpair", pair_address(pair_index), "/start"]
+    return commands
+
+
+async def run_bench(args) -> dict:
+    if not args.noise < args.band < args.excursion_size:
+        print("Warning: expected --noise < --band < --excursion-size, alerts will not line up with excursions.", file=sys.stderr)
+
+    if args.script:
+        excursions = load_excursions(args.script, args.pairs)
+    else:
+        excursions = periodic_excursions(args.pairs, args.excursion_every, args.excursion_length,
+                                         args.excursion_size, args.duration)
+    walk = PriceWalk(args.pairs, excursions, noise=args.noise, seed=args.seed)
+    chat_pairs = {FIRST_CHAT_ID + i: i % args.pairs for i in range(args.chats)}
+    recorder = Recorder(chat_pairs, walk, greetings_per_chat=3 if args.interval else 2)
+
+    dexscreener = FakeDexscreener(walk, args.dex_latency, args.dex_jitter, args.dex_error_rate, args.dex_rate_limit)
+    telegram = FakeTelegram(BOT_TOKEN, args.tg_latency, args.tg_error_rate, args.tg_flood_rate,
+                            args.tg_global_rate, args.tg_chat_rate, args.tg_chat_burst)
+    telegram.on_message = recorder.on_message
+    rpc = FakeRpc(walk, args.rpc_tick, args.rpc_drop_every) if args.rpc else None
+    dexscreener_url = await dexscreener.start()
+    telegram_url = await telegram.start()
+
+    workdir = tempfile.mkdtemp(prefix="blackhole-bench-")
+    log_path = args.bot_log or os.path.join(workdir, "bot.log")
+    env = dict(os.environ)
+    env.pop("TELEGRAM_CHAT_ID", None)
+    env.update({
+        "TELEGRAM_BOT_TOKEN": BOT_TOKEN,
+        "TELEGRAM_API_BASE_URL": telegram_url,
+        "DEXSCREENER_BASE_URL": dexscreener_url,
+        "MONITOR_DB_PATH": os.path.join(workdir, "monitors.db"),
+        "NO_PROXY": "127.0.0.1,localhost",
+        "PYTHONUNBUFFERED": "1",
+    })
+    if rpc is not None:
+        env["EVM_RPC_WS_URLS"] = f"avalanche={await rpc.start()}" # The bot's default chain
+
+    report = {"chats": args.chats, "pairs": args.pairs, "duration": args.duration}
+    with open(log_path, "w") as log:
+        started = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, str(BOT_SCRIPT), env=env, cwd=str(BOT_SCRIPT.parent), stdout=log, stderr=log
+        )
+        sampler = ProcessSampler(process.pid)
+        sampler.start()
+        try:
+            # Startup: until the bot polls for updates
+            await asyncio.wait_for(telegram.polling.wait(), 60)
+            report["startup_seconds"] = time.monotonic() - started
+
+            # Setup: every chat configures its monitor, all at once
+            setup_started = time.monotonic()
+            command_count = 0
+            for chat_id, pair_index in chat_pairs.items():
+                for text in setup_commands(args, pair_index):
+                    telegram.push_update(chat_id, text)
+                    command_count += 1
+            await asyncio.wait_for(recorder.configured.wait(), args.setup_timeout)
+            setup_seconds = time.monotonic() - setup_started
+            report["setup"] = {"commands": command_count, "seconds": setup_seconds,
+                               "commands_per_second": command_count / setup_seconds}
+
+            # Steady state: walk the prices
+            before = (dexscreener.requests, dexscreener.pairs_served, telegram.sent, sampler.cpu_seconds())
+            walk.start()
+            await asyncio.sleep(args.duration)
+            elapsed = walk.elapsed()
+            after = (dexscreener.requests, dexscreener.pairs_served, telegram.sent, sampler.cpu_seconds())
+        finally:
+            sampler.stop()
+            if process.returncode is None:
+                process.send_signal(signal.SIGINT)
+                try:
+                    await asyncio.wait_for(process.wait(), 30)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+            await telegram.stop()
+            await dexscreener.stop()
+            if rpc is not None:
+                await rpc.stop()
+
+    expected = recorder.expected_alerts()
+    cpu_seconds = None if after[3] is None else after[3] - before[3]
+    if cpu_seconds is None:
+        # No /proc: fall back to the CPU time of the exited child, including setup
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_seconds = usage.ru_utime + usage.ru_stime
+    report.update({
+        "dexscreener": {
+            "requests": after[0] - before[0],
+            "requests_per_second": (after[0] - before[0]) / elapsed,
+            "pair_quotes_per_second": (after[1] - before[1]) / elapsed,
+            "errors": dexscreener.errors,
+            "rate_limited": dexscreener.rate_limited,
+        },
+        "telegram": {
+            "messages": after[2] - before[2],
+            "messages_per_second": (after[2] - before[2]) / elapsed,
+            "errors": telegram.errors,
+            "flood_limited": telegram.flood_limited,
+        },
+        "alerts": {
+            "expected": expected,
+            "delivered": len(recorder.latencies),
+            "delivery": len(recorder.latencies) / expected if expected else None,
+            "extra": recorder.extra_alerts,
+            "latency_p50": percentile(recorder.latencies, 0.50),
+            "latency_p95": percentile(recorder.latencies, 0.95),
+            "latency_p99": percentile(recorder.latencies, 0.99),
+            "latency_max": max(recorder.latencies, default=None),
+        },
+        "cpu": {
+            "seconds": cpu_seconds,
+            "percent": cpu_seconds / elapsed * 100,
+        },
+        "memory": {"rss_mb": sampler.rss_mb, "peak_rss_mb": sampler.peak_rss_mb},
+        "rpc": None if rpc is None else {"events": rpc.events, "connections": rpc.connections, "drops": rpc.drops},
+        "bot_log": log_path,
+        "bot_exit_code": process.returncode,
+    })
+    return report
+
+
+def _seconds(value) -> str:
+    return "n/a" if value is None else f"{value:.2f}s"
+
+
+def _megabytes(value) -> str:
+    return "n/a" if value is None else f"{value:.1f} MB"
+
+
+def print_report(report: dict):
+    setup, dex, tg, alerts = report["setup"], report["dexscreener"], report["telegram"], report["alerts"]
+    delivery = "n/a" if alerts["delivery"] is None else f"{alerts['delivery'] * 100:.1f}%"
+    print(f"Bench: {report['chats']} chats on {report['pairs']} pairs, {report['duration']:.0f}s price walk")
+    print(f"Startup:     {_seconds(report['startup_seconds'])} until the first getUpdates")
+    print(f"Setup:       {setup['commands']} commands in {setup['seconds']:.1f}s ({setup['commands_per_second']:.1f} commands/s)")
+    print(f"Dexscreener: {dex['requests']} requests ({dex['requests_per_second']:.2f}/s), "
+          f"{dex['pair_quotes_per_second']:.1f} pair quotes/s, {dex['errors']} errors, {dex['rate_limited']} rate limited")
+    if report["rpc"] is not None:
+        rpc = report["rpc"]
+        print(f"RPC:         {rpc['events']} pool events, {rpc['connections']} connection(s), {rpc['drops']} drop(s)")
+    print(f"Telegram:    {tg['messages']} messages ({tg['messages_per_second']:.2f}/s), "
+          f"{tg['errors']} errors, {tg['flood_limited']} flood limited")
+    print(f"Alerts:      {alerts['delivered']}/{alerts['expected']} delivered ({delivery}), {alerts['extra']} extra; latency "
+          f"p50 {_seconds(alerts['latency_p50'])} p95 {_seconds(alerts['latency_p95'])} "
+          f"p99 {_seconds(alerts['latency_p99'])} max {_seconds(alerts['latency_max'])}")
+    print(f"CPU:         {report['cpu']['seconds']:.2f}s during the walk ({report['cpu']['percent']:.1f}% of a core)")
+    print(f"Memory:      RSS {_megabytes(report['memory']['rss_mb'])} at the end, peak {_megabytes(report['memory']['peak_rss_mb'])}")
+    print(f"Bot log:     {report['bot_log']} (exit code {report['bot_exit_code']})")
+
+
+def check_gates(args, report: dict) -> list:
+    failures = []
+    p95 = report["alerts"]["latency_p95"]
+    if args.max_alert_p95 is not None and (p95 is None or p95 > args.max_alert_p95):
+        failures.append(f"p95 alert latency {_seconds(p95)} > {args.max_alert_p95}s")
+    peak = report["memory"]["peak_rss_mb"]
+    if args.max_rss_mb is not None and peak is not None and peak > args.max_rss_mb:
+        failures.append(f"peak RSS {peak:.1f} MB > {args.max_rss_mb} MB")
+    if args.max_cpu_percent is not None and report["cpu"]["percent"] > args.max_cpu_percent:
+        failures.append(f"CPU {report['cpu']['percent']:.1f}% > {args.max_cpu_percent}%")
+    delivery = report["alerts"]["delivery"]
+    if args.min_delivery is not None and (delivery is None or delivery < args.min_delivery):
+        failures.append(f"alert delivery {delivery} < {args.min_delivery}")
+    return failures
+
+
+def main():
+    args = parse_args()
+    report = asyncio.run(run_bench(args))
+    print_report(report)
+    failures = check_gates(args, report)
+    report["gate_failures"] = failures
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
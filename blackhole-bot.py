@@ -1,5 +1,7 @@
+import time
+STARTED = time.perf_counter() # Start of the startup profile, taken before the heavy imports
+
 import asyncio
-from dexscreener import DexscreenerClient
 from telegram import Update
 from telegram.ext import (
     Application,
@@ -13,39 +15,143 @@ from telegram.ext import (
 import logging
 import os
 import datetime
+import html
+import re
+import secrets
+import tempfile
+
+from metrics import MetricsRegistry, MetricsServer
+from monitor_store import MonitorConfig, MonitorStore
+from price_monitor import PriceMonitor
+from send_queue import PRIORITY_REPLY, DeliveryQueue
+from sharding import ShardedMonitor
+from startup_profile import StartupProfile
+from update_processor import PerChatUpdateProcessor
 
 # --- Configure Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # --- Conversation States ---
-SET_PAIR_ADDRESS, SET_PRICE_RANGE, SET_CHECK_INTERVAL, SET_CHAIN_ID = range(4)
+SET_PAIR_ADDRESS, SET_PRICE_RANGE, SET_CHECK_INTERVAL, SET_CHAIN_ID, SET_MOVE_RULE, SET_REARM_MARGIN, SET_CONFIRM_TICKS = range(7)
 
 class BlackholePriceBot:
-    def __init__(self, token: str, chat_id: str):
+    # Pairs due within this window are fetched together; chunks are spread across it
+    BATCH_WINDOW_SECONDS = 5
+    # How often changed monitor configs are written to the database
+    STORE_FLUSH_SECONDS = 2
+
+    # Price samples kept per watched pair and the /history windows; samples are spaced so the
+    # capacity spans the longest window (a day at one sample per 30s)
+    HISTORY_CAPACITY = 2880
+    HISTORY_WINDOWS = {'5m': 300, '1h': 3600, '6h': 21600, '24h': 86400}
+    HISTORY_DEFAULT_LAST_N = 5
+
+    # Every handler is a command or text handler on new messages; nothing else needs to reach the bot
+    ALLOWED_UPDATES = [Update.MESSAGE]
+
+    # Defaults for chats that have not configured their monitor yet, updated per chat by commands
+    DEFAULT_CHAIN_ID = "avalanche"
+    DEFAULT_PAIR_ADDRESS = "0x859592A4A469610E573f96Ef87A0e5565F9a94c8"
+    DEFAULT_PRICE_THRESHOLD_LOWER = 1.0002
+    DEFAULT_PRICE_THRESHOLD_UPPER = 1.0003
+    DEFAULT_CHECK_INTERVAL_SECONDS = 120 # Longest interval; calm pairs back off up to this
+    DEFAULT_MIN_CHECK_INTERVAL_SECONDS = 15 # Shortest interval, used when the price nears a threshold
+    DEFAULT_ALERT_COOLDOWN_SECONDS = 300 # 5 minutes default cooldown
+
+    def __init__(self, token: str, chat_id: str, db_path: str = "monitors.db",
+                 request_timeout: float = 10, hedge_requests: bool = False,
+                 metrics_port: int = None, metrics_host: str = "127.0.0.1",
+                 dexscreener_base_url: str = None, telegram_base_url: str = None,
+                 update_concurrency: int = 16, shard_workers: int = 0, shard_socket: str = None,
+                 rpc_urls: dict = None, tick_dir: str = None, shard_token: str = None):
+        self.startup = StartupProfile(STARTED)
+        self.startup.mark("imports")
         self.telegram_bot_token = token
         # Store as int for send_message, allow None if not set
         self.telegram_chat_id = int(chat_id) if chat_id else None 
 
-        # Dynamic configuration variables, will be updated by commands
-        self.current_dexscreener_chain_id = "avalanche"
-        self.current_dexscreener_pair_address = "0x859592A4A469610E573f96Ef87A0e5565F9a94c8"
-        self.current_price_threshold_lower = 1.0002
-        self.current_price_threshold_upper = 1.0003 
-        self.current_check_interval_seconds = 120
-        self.alert_cooldown_seconds = 300 # 10 minutes default cooldown
-
-        self.dexscreener_client = DexscreenerClient()
-        self.monitor_job = None # To hold the scheduled job object
-
-        self.application = Application.builder().token(self.telegram_bot_token).build()
+        # Per-chat monitor settings and alert state, persisted so they survive restarts
+        self.monitor_store = MonitorStore(db_path)
+
+        # All outgoing messages go through here so bursts of alerts respect Telegram's rate limits
+        self.delivery_queue = DeliveryQueue(self._deliver_message)
+        self._setup_metrics()
+        if shard_workers or shard_socket:
+            # Polling and alert evaluation run in worker processes, each owning a share of the pairs
+            self.monitor = ShardedMonitor(
+                # By default in a fresh directory only this user can enter
+                shard_socket or os.path.join(tempfile.mkdtemp(prefix="blackhole-bot-"), "shards.sock"),
+                self.delivery_queue.enqueue,
+                self.monitor_store.mark_dirty,
+                worker_settings={
+                    "dexscreener_base_url": dexscreener_base_url,
+                    "batch_window": self.BATCH_WINDOW_SECONDS,
+                    "history_capacity": self.HISTORY_CAPACITY,
+                    "history_windows": self.HISTORY_WINDOWS,
+                    "request_timeout": request_timeout,
+                    "hedge_requests": hedge_requests,
+                    "rpc_urls": rpc_urls,
+                    "tick_dir": tick_dir,
+                },
+                local_workers=shard_workers,
+                token=shard_token,
+                metrics_port=metrics_port,
+            )
+        else:
+            self.monitor = PriceMonitor(
+                dexscreener_base_url,
+                self.metrics,
+                self.delivery_queue.enqueue,
+                self.monitor_store.mark_dirty,
+                batch_window=self.BATCH_WINDOW_SECONDS,
+                history_capacity=self.HISTORY_CAPACITY,
+                history_windows=self.HISTORY_WINDOWS,
+                request_timeout=request_timeout,
+                hedge_requests=hedge_requests,
+                rpc_urls=rpc_urls,
+                tick_dir=tick_dir,
+            )
+        # Prometheus text endpoint, only started when a port is configured
+        self.metrics_server = MetricsServer(self.metrics, metrics_host, metrics_port) if metrics_port else None
+
+        builder = (
+            Application.builder()
+            .token(self.telegram_bot_token)
+            .post_init(self._post_init)
+            .post_stop(self._post_stop)
+            .post_shutdown(self._post_shutdown)
+            # Different chats are handled concurrently, each chat's updates in order
+            .concurrent_updates(PerChatUpdateProcessor(update_concurrency))
+        )
+        if telegram_base_url:
+            builder.base_url(telegram_base_url) # e.g. a local Bot API server
+        self.application = builder.build()
         self._register_handlers()
+        self.startup.mark("setup")
+
+    def _setup_metrics(self):
+        """
+        Creates the histograms updated on the hot paths, and gauges read at scrape time.
+        The price monitor adds its fetch and alert metrics; in sharded mode each worker serves its own.
+        """
+        self.metrics = MetricsRegistry()
+        self.send_latency = self.metrics.histogram(
+            "telegram_send_seconds", "Latency of Telegram sendMessage calls.")
+        self.job_lag = self.metrics.histogram(
+            "jobqueue_lag_seconds", "Delay between a repeating job's planned and actual run time.", ("job",))
+        self.metrics.gauge("active_monitors", "Chats with an active monitor.", lambda: len(self.monitor))
+        self.metrics.gauge("watched_pairs", "Pairs being polled.", lambda: self.monitor.watched_pairs)
+        self.metrics.gauge("delivery_queue_messages", "Messages waiting to be sent.", lambda: len(self.delivery_queue))
+        self.metrics.gauge("startup_seconds", "Time from process start until the bot took updates.", lambda: self.startup.total)
 
     def _register_handlers(self):
         """Registers all command and conversation handlers."""
         self.application.add_handler(CommandHandler("start", self.start_command))
         self.application.add_handler(CommandHandler("stop", self.stop_command))
         self.application.add_handler(CommandHandler("status", self.status_command))
+        self.application.add_handler(CommandHandler("history", self.history_command))
+        self.application.add_handler(CommandHandler("metrics", self.metrics_command))
 
         # Conversation handlers
         self.application.add_handler(ConversationHandler(
@@ -64,6 +170,30 @@ class BlackholePriceBot:
             fallbacks=[CommandHandler("cancel", self.cancel_command)],
         ))
 
+        self.application.add_handler(ConversationHandler(
+            entry_points=[CommandHandler("setmove", self.set_move_rule_start)],
+            states={
+                SET_MOVE_RULE: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.set_move_rule_received)],
+            },
+            fallbacks=[CommandHandler("cancel", self.cancel_command)],
+        ))
+
+        self.application.add_handler(ConversationHandler(
+            entry_points=[CommandHandler("sethysteresis", self.set_rearm_margin_start)],
+            states={
+                SET_REARM_MARGIN: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.set_rearm_margin_received)],
+            },
+            fallbacks=[CommandHandler("cancel", self.cancel_command)],
+        ))
+
+        self.application.add_handler(ConversationHandler(
+            entry_points=[CommandHandler("setconfirm", self.set_confirm_ticks_start)],
+            states={
+                SET_CONFIRM_TICKS: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.set_confirm_ticks_received)],
+            },
+            fallbacks=[CommandHandler("cancel", self.cancel_command)],
+        ))
+
 
         self.application.add_handler(ConversationHandler(
             entry_points=[CommandHandler("setinterval", self.set_check_interval_start)],
@@ -84,99 +214,104 @@ class BlackholePriceBot:
         # Error handler
         self.application.add_error_handler(self.error_handler)
 
-    async def _send_telegram_message(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_text: str):
-        """Sends a message to the configured Telegram chat."""
-        try:
-            await context.bot.send_message(chat_id=chat_id, text=message_text, parse_mode='HTML')
-            logger.info(f"Notification sent to Telegram chat {chat_id}: {message_text}")
-        except Exception as e:
-            logger.error(f"Error sending Telegram message to chat {chat_id}: {e}")
+    async def _post_init(self, application: Application):
+        """Loads the stored monitors, restarts the active ones and starts the polling and flush jobs."""
+        self.startup.mark("initialize") # Includes Telegram's getMe
+        self.delivery_queue.start()
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+        await asyncio.to_thread(self.monitor_store.open)
+        self.startup.mark("store")
+        restored = self.monitor_store.active_configs()
+        # Spread the restored pairs' first checks over their interval instead of polling them all at once
+        for config in restored:
+            self.monitor.add(config, stagger=True)
+        self.startup.mark("restore")
+        logger.info(f"Restored {len(restored)} active monitor(s) watching {self.monitor.watched_pairs} pair(s).")
+
+        if isinstance(self.monitor, ShardedMonitor):
+            await self.monitor.start()
+        else:
+            application.job_queue.run_repeating(
+                self._monitor_price_loop,
+                interval=self.BATCH_WINDOW_SECONDS,
+                first=0,
+                name="price_feed_batch"
+            )
+        application.job_queue.run_repeating(
+            self._flush_monitor_store,
+            interval=self.STORE_FLUSH_SECONDS,
+            first=self.STORE_FLUSH_SECONDS,
+            name="monitor_store_flush"
+        )
+        self.startup.mark("jobs")
+        self.startup.report(f", {len(restored)} monitor(s) restored")
+
+    async def _post_stop(self, application: Application):
+        """Stops the price checks, then lets queued messages go out while the bot can still send them."""
+        await self.monitor.stop()
+        await self.delivery_queue.stop()
+
+    async def _post_shutdown(self, application: Application):
+        """Writes outstanding monitor changes before the process exits."""
+        await self.monitor_store.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+
+    async def _flush_monitor_store(self, context: ContextTypes.DEFAULT_TYPE):
+        self._observe_job_lag(context, self.STORE_FLUSH_SECONDS)
+        await self.monitor_store.flush()
+
+    def _observe_job_lag(self, context: ContextTypes.DEFAULT_TYPE, interval: float):
+        """Records how late a repeating job runs. The job's next run is already planned, so this run was due one interval earlier."""
+        next_t = context.job.next_t
+        if next_t is None:
+            return
+        planned = next_t.timestamp() - interval
+        self.job_lag.observe(max(0.0, time.time() - planned), context.job.name)
+
+    def _default_config(self, chat_id: int) -> MonitorConfig:
+        return MonitorConfig(
+            chat_id,
+            chain_id=self.DEFAULT_CHAIN_ID,
+            pair_address=self.DEFAULT_PAIR_ADDRESS,
+            price_lower=self.DEFAULT_PRICE_THRESHOLD_LOWER,
+            price_upper=self.DEFAULT_PRICE_THRESHOLD_UPPER,
+            check_interval=self.DEFAULT_CHECK_INTERVAL_SECONDS,
+            alert_cooldown=self.DEFAULT_ALERT_COOLDOWN_SECONDS,
+            min_check_interval=self.DEFAULT_MIN_CHECK_INTERVAL_SECONDS,
+        )
 
-    async def _get_dex_pair_data(self, chain_id: str, pair_address: str):
-        """
-        Fetches the pair data from Dexscreener.
-        Returns the pair data object or None if an error occurs or no data is found.
-        """
+    def _config_for(self, chat_id: int) -> MonitorConfig:
+        """Returns the chat's monitor config, creating it from the defaults on first use."""
+        config = self.monitor_store.get(chat_id)
+        if config is None:
+            config = self.monitor_store.add(self._default_config(chat_id))
+        return config
+
+    @staticmethod
+    def _format_interval_bounds(config: MonitorConfig) -> str:
+        min_interval, max_interval = config.interval_bounds
+        return str(max_interval) if min_interval == max_interval else f"{min_interval}-{max_interval}"
+
+    async def _send_telegram_message(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_text: str,
+                                     priority: int = PRIORITY_REPLY):
+        """Queues a message for the Telegram chat. Returns immediately, delivery is rate limited."""
+        self.delivery_queue.enqueue(chat_id, message_text, priority)
+
+    async def _deliver_message(self, chat_id: int, message_text: str):
+        """Sends a message to the Telegram chat. Called by the delivery queue, which handles errors and retries."""
+        started = time.perf_counter()
         try:
-            pairs_data = await self.dexscreener_client.get_token_pair_async(chain_id, pair_address)
-
-            if pairs_data and pairs_data.base_token and pairs_data.quote_token:
-                logger.info(f"Successfully fetched data for {pairs_data.base_token.symbol}/{pairs_data.quote_token.symbol} on {chain_id}.")
-                return pairs_data
-            else:
-                logger.warning(f"No data found for pair {pair_address} on chain {chain_id}.")
-                return None
-        except Exception as e:
-            logger.error(f"An error occurred while fetching Dexscreener data for {pair_address} on {chain_id}: {e}")
-            return None
+            await self.application.bot.send_message(chat_id=chat_id, text=message_text, parse_mode='HTML')
+        finally:
+            self.send_latency.observe(time.perf_counter() - started)
+        logger.info(f"Notification sent to Telegram chat {chat_id}: {message_text}")
 
     async def _monitor_price_loop(self, context: ContextTypes.DEFAULT_TYPE):
-        """Monitors the price and sends alerts if it drops below the threshold."""
-        print(context.job.data)
-        chat_id = context.job.data['chat_id'] # Get the chat_id from the job data
-        
-        # Ensure context.chat_data is a dictionary. For JobQueue, context.chat_data *should* be
-        # correctly set by PTB when chat_id is passed in run_repeating.
-        # If for some reason it's None (e.g., no persistence, or specific PTB version quirks),
-        # initialize it as an empty dictionary for the current execution.
-        # Note: Without persistence, this data will NOT survive bot restarts.
-        if context.chat_data is None:
-            context.chat_data = {}
-            logger.warning(f"context.chat_data was None for chat {chat_id} in job. Initializing locally for this run. "
-                           "Consider adding persistence to Application for data to survive restarts.")
-        
-        # Use context.chat_data directly
-        # Initialize if not present
-        if 'last_alert_time' not in context.chat_data:
-            context.chat_data['last_alert_time'] = None
-        last_alert_time = context.chat_data['last_alert_time']
-
-
-        logger.info(f"Monitor running for chat {chat_id} with pair {self.current_dexscreener_pair_address} on {self.current_dexscreener_chain_id} (interval: {self.current_check_interval_seconds}s)")
-
-        # Use instance variables for configuration (they are already updated by set commands)
-        chain_id = self.current_dexscreener_chain_id
-        pair_address = self.current_dexscreener_pair_address
-        alert_cooldown = self.alert_cooldown_seconds
-
-        pairs_data = await self._get_dex_pair_data(chain_id, pair_address)
-
-        if pairs_data:
-            current_price_native = float(pairs_data.price_native)
-            logger.info(f"{pairs_data.base_token.symbol}/{pairs_data.quote_token.symbol} - Current Price {pairs_data.quote_token.symbol}: ${current_price_native:.6f}")
-            
-            if not (current_price_native >= self.current_price_threshold_lower and current_price_native <= self.current_price_threshold_upper):
-                current_time = datetime.datetime.now().timestamp()
-                if last_alert_time is None or (current_time - last_alert_time) > alert_cooldown:
-                    message = (
-                        f"🚨 **PRICE ALERT!** 🚨\n\n"
-                        f"The price of {pairs_data.base_token.symbol} got out of Range ${self.current_price_threshold_lower} - {self.current_price_threshold_upper}!\n"
-                        f"Current Price: **${current_price_native:.6f} USD**\n"
-                        f"Pool: <a href='{pairs_data.url}'>{pairs_data.base_token.symbol}/{pairs_data.quote_token.symbol} on {pairs_data.dex_id}</a>\n"
-                        f"Chain: {pairs_data.chain_id.capitalize()}"
-                    )
-                    await self._send_telegram_message(context, chat_id, message)
-                    context.chat_data['last_alert_time'] = current_time # Update in chat_data
-                else:
-                    logger.info(f"Price below threshold, but still in cooldown period ({(alert_cooldown - (current_time - last_alert_time)) / 60:.1f} minutes remaining).")
-            else:
-                # If price is back above threshold, reset cooldown
-                if last_alert_time is not None:
-                    logger.info("Price is back above threshold. Resetting alert cooldown.")
-                    context.chat_data['last_alert_time'] = None 
-                    # Also clear the fetch error alert if price is back to normal
-                    if 'last_fetch_error_alert' in context.chat_data:
-                        del context.chat_data['last_fetch_error_alert']
-        else:
-            logger.warning("Skipping price check due to previous data fetching error.")
-            # If there's an error fetching data, send a warning to the user if it's the first time
-            if 'last_fetch_error_alert' not in context.chat_data or \
-               (datetime.datetime.now().timestamp() - context.chat_data['last_fetch_error_alert']) > alert_cooldown: # Use alert_cooldown for this too
-                await self._send_telegram_message(context, chat_id,
-                                                   "⚠️ **Warning:** Could not fetch price data from Dexscreener. The monitor will retry.")
-                context.chat_data['last_fetch_error_alert'] = datetime.datetime.now().timestamp()
-            else:
-                logger.debug("Skipping fetch error alert due to cooldown.")
+        """Collects the pairs due in this window and polls them in multi-pair chunks spread across it."""
+        self._observe_job_lag(context, self.BATCH_WINDOW_SECONDS)
+        self.monitor.poll()
 
     # --- Telegram Bot Command Handlers (now methods of the class) ---
 
@@ -184,23 +319,13 @@ class BlackholePriceBot:
         """Sends a message when the command /start is issued and starts monitoring."""
         chat_id = update.effective_chat.id
 
-        # Stop any existing monitoring task for this chat
-        current_jobs = context.job_queue.get_jobs_by_name(f"price_monitor_{chat_id}")
-        for job in current_jobs:
-            job.schedule_removal()
-            logger.info(f"Existing monitoring job '{job.name}' for chat {chat_id} cancelled and removed.")
-
-        # Schedule the new monitoring job
-        self.monitor_job = context.job_queue.run_repeating(
-            self._monitor_price_loop,
-            interval=self.current_check_interval_seconds,
-            first=0, # Run immediately once
-            # Passing chat_id here helps PTB associate chat_data with the job context
-            data={'chat_id': chat_id}, # <--- CHANGE HERE
-            chat_id=chat_id, 
-            name=f"price_monitor_{chat_id}"
-        )
-        logger.info(f"Price monitor for chat {chat_id} scheduled to run every {self.current_check_interval_seconds} seconds.")
+        config = self._config_for(chat_id)
+        config.active = True
+        self.monitor_store.mark_dirty(config)
+
+        # A chat joining an already polled pair gets one check right away
+        self.monitor.add(config)
+        logger.info(f"Monitoring for chat {chat_id} started, checked every {self._format_interval_bounds(config)} seconds.")
 
         message = (
             "Hello! I'm your Crypto Price Alert Bot. 🚀\n\n"
@@ -208,9 +333,13 @@ class BlackholePriceBot:
             "You can configure me using these commands:\n"
             "/setpair - Set the Dexscreener pair address.\n"
             "/setrange - Set the price threshold.\n"
+            "/setmove - Alert on a percent move within a time window.\n"
+            "/sethysteresis - Set the re-arm margin inside the range.\n"
+            "/setconfirm - Require several ticks outside the range before alerting.\n"
             "/setinterval - Set the check interval in seconds.\n"
             "/setchain - Set the Dexscreener chain ID.\n"
             "/status - Get the current monitoring status and settings.\n"
+            "/history - Show recent price statistics of the pair.\n"
             "/stop - Stop the price monitoring."
         )
         await self._send_telegram_message(context, chat_id, message)
@@ -218,13 +347,12 @@ class BlackholePriceBot:
     async def stop_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Stops the price monitoring."""
         chat_id = update.effective_chat.id
-        jobs_to_remove = context.job_queue.get_jobs_by_name(f"price_monitor_{chat_id}")
-
-        if jobs_to_remove:
-            for job in jobs_to_remove:
-                job.schedule_removal() # Removes the job from the queue
-                logger.info(f"Price monitoring job '{job.name}' for chat {chat_id} stopped and removed.")
-            self.monitor_job = None # Clear global reference if all jobs are removed
+        if self.monitor.is_active(chat_id):
+            self.monitor.remove(chat_id)
+            config = self.monitor_store.get(chat_id)
+            config.active = False
+            self.monitor_store.mark_dirty(config)
+            logger.info(f"Price monitoring for chat {chat_id} stopped.")
             await self._send_telegram_message(context, chat_id, "Price monitoring has been stopped.")
         else:
             await self._send_telegram_message(context, chat_id, "No active price monitoring to stop for this chat.")
@@ -232,22 +360,80 @@ class BlackholePriceBot:
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Shows the current monitoring status and settings."""
         
-        monitor_active = bool(context.job_queue.get_jobs_by_name(f"price_monitor_{update.effective_chat.id}"))
+        chat_id = update.effective_chat.id
+        monitor_active = self.monitor.is_active(chat_id)
+        config = self.monitor_store.get(chat_id) or self._default_config(chat_id)
 
-        upper_threshold_display = f"${self.current_price_threshold_upper:.6f}" if self.current_price_threshold_upper is not None else "Disabled"
+        upper_threshold_display = f"${config.price_upper:.6f}" if config.price_upper is not None else "Disabled"
+        current_interval = await self.monitor.current_interval(chat_id) if monitor_active else None
+        current_interval_display = f" (currently every {current_interval:.0f}s)" if current_interval is not None else ""
+        move_display = f"{config.move_percent:g}% within {config.move_window // 60} minutes" if config.move_percent else "Disabled"
+        rearm_display = f"{config.rearm_margin:g}%" if config.rearm_margin else "Disabled"
+        confirm_display = f"{config.confirm_ticks} ticks outside the range" if config.confirm_ticks else "Disabled"
 
         message = (
             "📊 Current Monitoring Status:\n\n"
-            f"Chain ID: {self.current_dexscreener_chain_id}\n"
-            f"Pair Address: {self.current_dexscreener_pair_address}\n"
-            f"Lower Price Threshold: ${self.current_price_threshold_lower:.6f}\n"
+            f"Chain ID: {config.chain_id}\n"
+            f"Pair Address: {config.pair_address}\n"
+            f"Lower Price Threshold: ${config.price_lower:.6f}\n"
             f"Upper Price Threshold: {upper_threshold_display}\n"
-            f"Check Interval: {self.current_check_interval_seconds} seconds\n"
-            f"Alert Cooldown: {self.alert_cooldown_seconds} seconds\n\n"
+            f"Check Interval: {self._format_interval_bounds(config)} seconds{current_interval_display}\n"
+            f"Move Alert: {move_display}\n"
+            f"Re-arm Margin: {rearm_display}\n"
+            f"Confirmation: {confirm_display}\n"
+            f"Alert Cooldown: {config.alert_cooldown} seconds\n\n"
             f"Monitoring active: {'Yes' if monitor_active else 'No'}"
         )
         await self._send_telegram_message(context, update.effective_chat.id, message)
 
+    async def history_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Shows price statistics of the watched pair: /history [window] [last N]."""
+        chat_id = update.effective_chat.id
+        if not self.monitor.is_active(chat_id):
+            await self._send_telegram_message(context, chat_id, "No price history yet. Start monitoring with /start.")
+            return
+
+        windows = dict(self.HISTORY_WINDOWS)
+        last_n = self.HISTORY_DEFAULT_LAST_N
+        for arg in context.args or []:
+            if arg.lower() in self.HISTORY_WINDOWS:
+                windows = {arg.lower(): self.HISTORY_WINDOWS[arg.lower()]}
+            elif arg.isdigit() and int(arg) > 0:
+                last_n = min(int(arg), self.HISTORY_CAPACITY)
+            else:
+                await self._send_telegram_message(context, chat_id,
+                                                   f"❌ Unknown argument {arg}. Usage: /history [{'|'.join(self.HISTORY_WINDOWS)}] [last N]")
+                return
+
+        history = await self.monitor.history(chat_id, windows, last_n)
+        if history is None:
+            await self._send_telegram_message(context, chat_id, "No price history yet. Start monitoring with /start.")
+            return
+
+        chain_id, pair_address = history['key']
+        lines = [f"📈 Price History ({pair_address} on {chain_id}):\n"]
+        for label, summary in history['windows'].items():
+            if summary is None:
+                lines.append(f"{label}: no data")
+                continue
+            lines.append(
+                f"{label}: min ${summary['min']:.6f} / max ${summary['max']:.6f} / mean ${summary['mean']:.6f}, "
+                f"change {summary['change_pct']:+.3f}% ({summary['count']} samples)"
+            )
+        lines.append(f"\nLast {last_n} prices:")
+        for timestamp, price in history['last']:
+            lines.append(f"{datetime.datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')} ${price:.6f}")
+        await self._send_telegram_message(context, chat_id, "\n".join(lines))
+
+    async def metrics_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Shows the bot's metrics. Only available in the admin chat (TELEGRAM_CHAT_ID)."""
+        chat_id = update.effective_chat.id
+        if self.telegram_chat_id is None or chat_id != self.telegram_chat_id:
+            logger.warning(f"Chat {chat_id} requested /metrics but is not the admin chat.")
+            await self._send_telegram_message(context, chat_id, "❌ This command is only available to the bot admin.")
+            return
+        await self._send_telegram_message(context, chat_id, f"📟 Metrics:\n<pre>{html.escape(self.metrics.summary())}</pre>")
+
     # --- Conversation Handlers (now methods of the class) ---
 
     async def set_pair_address_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -260,9 +446,11 @@ class BlackholePriceBot:
         new_address = update.message.text.strip()
 
         if len(new_address) == 42 and new_address.startswith('0x'): # Basic validation
-            self.current_dexscreener_pair_address = new_address
+            config = self._config_for(update.effective_chat.id)
+            config.pair_address = new_address
+            self.monitor_store.mark_dirty(config)
             await self._send_telegram_message(context, update.effective_chat.id,
-                                               f"✅ Pair address updated to: {self.current_dexscreener_pair_address}. Restarting monitor to apply.")
+                                               f"✅ Pair address updated to: {config.pair_address}. Restarting monitor to apply.")
             await self.start_command(update, context) # Restart monitor with new settings
             return ConversationHandler.END
         else:
@@ -309,13 +497,17 @@ class BlackholePriceBot:
                                                        "Or send /cancel to abort.")
                     return SET_PRICE_RANGE
 
-            self.current_price_threshold_lower = new_lower_price
-            self.current_price_threshold_upper = new_upper_price
+            config = self._config_for(update.effective_chat.id)
+            config.price_lower = new_lower_price
+            config.price_upper = new_upper_price
+            self.monitor_store.mark_dirty(config)
+            if self.monitor.is_active(config.chat_id):
+                self.monitor.add(config) # Re-index the new range
 
             message = f"✅ Price thresholds updated!\n" \
-                      f"Lower: ${self.current_price_threshold_lower:.6f}\n"
-            if self.current_price_threshold_upper is not None:
-                message += f"Upper: ${self.current_price_threshold_upper:.6f}\n"
+                      f"Lower: ${config.price_lower:.6f}\n"
+            if config.price_upper is not None:
+                message += f"Upper: ${config.price_upper:.6f}\n"
             else:
                 message += "Upper: Disabled (monitoring for drop below lower limit only)\n"
             message += "The monitor will use these new thresholds on its next check."
@@ -331,25 +523,155 @@ class BlackholePriceBot:
             return SET_PRICE_RANGE
         
 
+    async def set_move_rule_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Asks the user for the percent move rule."""
+        await self._send_telegram_message(context, update.effective_chat.id,
+                                           "Please send me the **percent move** to alert on and its window in minutes, "
+                                           "in `percent - minutes` format (e.g., 5 - 60 alerts when the price moves 5% within an hour).\n"
+                                           "Send `off` to disable move alerts.")
+        return SET_MOVE_RULE
+
+    async def set_move_rule_received(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Receives the percent move rule and updates the setting."""
+        text = update.message.text.strip().lower()
+        try:
+            if text in ('off', 'none', '0'):
+                new_move_percent, new_move_window = None, None
+            else:
+                parts = [p.strip().rstrip('%') for p in text.split('-')]
+                if len(parts) != 2:
+                    raise ValueError("Expected percent - minutes.")
+                new_move_percent = float(parts[0])
+                new_move_minutes = int(parts[1])
+                if new_move_percent <= 0 or new_move_minutes <= 0:
+                    raise ValueError("Percent and minutes must be positive.")
+                new_move_window = new_move_minutes * 60
+        except ValueError:
+            await self._send_telegram_message(context, update.effective_chat.id,
+                                               "❌ Invalid move rule. Please send a positive percent and a whole number of minutes (e.g., 5 - 60), or `off`.\n"
+                                               "Or send /cancel to abort.")
+            return SET_MOVE_RULE
+
+        config = self._config_for(update.effective_chat.id)
+        config.move_percent = new_move_percent
+        config.move_window = new_move_window
+        self.monitor_store.mark_dirty(config)
+        if self.monitor.is_active(config.chat_id):
+            self.monitor.add(config) # Re-index the new rule
+
+        if new_move_percent is None:
+            message = "✅ Move alerts disabled."
+        else:
+            message = f"✅ Move alert updated: {new_move_percent:g}% within {new_move_window // 60} minutes."
+        await self._send_telegram_message(context, update.effective_chat.id, message)
+        return ConversationHandler.END
+
+    async def set_rearm_margin_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Asks the user for the re-arm margin."""
+        await self._send_telegram_message(context, update.effective_chat.id,
+                                           "Please send me the **re-arm margin** in percent (e.g., 0.5).\n"
+                                           "After an alert, the price has to come back this far inside the range before "
+                                           "a new exit counts as a fresh alert, so a price hovering at a threshold does not keep re-alerting. "
+                                           "Send 0 to disable.")
+        return SET_REARM_MARGIN
+
+    async def set_rearm_margin_received(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Receives the re-arm margin and updates the setting."""
+        try:
+            new_rearm_margin = float(update.message.text.strip().rstrip('%'))
+            if new_rearm_margin < 0 or new_rearm_margin >= 100:
+                raise ValueError("Margin must be between 0 and 100.")
+        except ValueError:
+            await self._send_telegram_message(context, update.effective_chat.id,
+                                               "❌ Invalid margin. Please send a percent between 0 and 100 (e.g., 0.5).\n"
+                                               "Or send /cancel to abort.")
+            return SET_REARM_MARGIN
+
+        config = self._config_for(update.effective_chat.id)
+        if new_rearm_margin and config.price_upper is not None and \
+                config.price_lower * (1 + new_rearm_margin / 100) > config.price_upper * (1 - new_rearm_margin / 100):
+            await self._send_telegram_message(context, update.effective_chat.id,
+                                               f"❌ A {new_rearm_margin:g}% margin leaves nothing of the range "
+                                               f"${config.price_lower:.6f} - ${config.price_upper:.6f} to re-arm in.\n"
+                                               "Please send a smaller margin.\n"
+                                               "Or send /cancel to abort.")
+            return SET_REARM_MARGIN
+
+        config.rearm_margin = new_rearm_margin or None
+        self.monitor_store.mark_dirty(config)
+        if self.monitor.is_active(config.chat_id):
+            self.monitor.add(config) # Re-index the new margin
+
+        if config.rearm_margin is None:
+            message = "✅ Re-arm margin disabled."
+        else:
+            message = f"✅ Re-arm margin updated to {config.rearm_margin:g}%."
+        await self._send_telegram_message(context, update.effective_chat.id, message)
+        return ConversationHandler.END
+
+    async def set_confirm_ticks_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Asks the user for the number of confirmation ticks."""
+        await self._send_telegram_message(context, update.effective_chat.id,
+                                           "Please send me how many **consecutive price checks** must be outside the range before alerting (e.g., 3).\n"
+                                           "Send 1 to alert on the first one.")
+        return SET_CONFIRM_TICKS
+
+    async def set_confirm_ticks_received(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Receives the number of confirmation ticks and updates the setting."""
+        try:
+            new_confirm_ticks = int(update.message.text.strip())
+            if new_confirm_ticks <= 0:
+                raise ValueError("Ticks must be positive.")
+        except ValueError:
+            await self._send_telegram_message(context, update.effective_chat.id,
+                                               "❌ Invalid number. Please send a positive integer (e.g., 3).\n"
+                                               "Or send /cancel to abort.")
+            return SET_CONFIRM_TICKS
+
+        config = self._config_for(update.effective_chat.id)
+        config.confirm_ticks = new_confirm_ticks if new_confirm_ticks > 1 else None
+        self.monitor_store.mark_dirty(config)
+        if self.monitor.is_active(config.chat_id):
+            self.monitor.add(config) # Re-index the new confirmation
+
+        if config.confirm_ticks is None:
+            message = "✅ Confirmation disabled, alerting on the first check outside the range."
+        else:
+            message = f"✅ Alerting after {config.confirm_ticks} consecutive checks outside the range."
+        await self._send_telegram_message(context, update.effective_chat.id, message)
+        return ConversationHandler.END
+
     async def set_check_interval_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Asks the user for the new check interval."""
-        await self._send_telegram_message(context, update.effective_chat.id, "Please send me the new **check interval** in seconds (e.g., 60, 120):")
+        await self._send_telegram_message(context, update.effective_chat.id,
+                                           "Please send me the new **check interval** in seconds.\n"
+                                           "Send a single value for a fixed interval (e.g., 60) or min - max (e.g., 15 - 300) "
+                                           "to check more often near your thresholds and less often when the price is calm.")
         return SET_CHECK_INTERVAL
 
     async def set_check_interval_received(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-        """Receives the check interval and updates the setting."""
+        """Receives the check interval (fixed or min - max) and updates the setting."""
         try:
-            new_interval = int(update.message.text.strip())
-            if new_interval <= 0:
+            parts = [p.strip() for p in update.message.text.strip().split('-')]
+            if len(parts) > 2:
+                raise ValueError("Too many values.")
+            new_min_interval = int(parts[0])
+            new_max_interval = int(parts[-1])
+            if new_min_interval <= 0 or new_max_interval <= 0:
                 raise ValueError("Interval must be positive.")
-            self.current_check_interval_seconds = new_interval
+            if new_max_interval < new_min_interval:
+                raise ValueError("Maximum interval cannot be less than the minimum.")
+            config = self._config_for(update.effective_chat.id)
+            config.check_interval = new_max_interval
+            config.min_check_interval = new_min_interval if len(parts) == 2 else None
+            self.monitor_store.mark_dirty(config)
             await self._send_telegram_message(context, update.effective_chat.id,
-                                               f"✅ Check interval updated to: {self.current_check_interval_seconds} seconds. Restarting monitor to apply immediately.")
+                                               f"✅ Check interval updated to: {self._format_interval_bounds(config)} seconds. Restarting monitor to apply immediately.")
             await self.start_command(update, context) # Restart monitor with new interval
             return ConversationHandler.END
         except ValueError:
             await self._send_telegram_message(context, update.effective_chat.id,
-                                               "❌ Invalid interval. Please send a positive integer (e.g., 60).\n"
+                                               "❌ Invalid interval. Please send a positive integer (e.g., 60) or a range (e.g., 15 - 300).\n"
                                                "Or send /cancel to abort.")
             return SET_CHECK_INTERVAL
 
@@ -361,10 +683,18 @@ class BlackholePriceBot:
     async def set_chain_id_received(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Receives the chain ID and updates the setting."""
         new_chain_id = update.message.text.strip().lower() # Convert to lowercase for consistency
-        
-        self.current_dexscreener_chain_id = new_chain_id
+        # Dexscreener chain IDs are short slugs; anything else would end up in requests and metric labels
+        if not re.fullmatch(r'[a-z0-9-]{1,32}', new_chain_id):
+            await self._send_telegram_message(context, update.effective_chat.id,
+                                               "❌ Invalid chain ID. Please send a Dexscreener chain ID like avalanche or ethereum.\n"
+                                               "Or send /cancel to abort.")
+            return SET_CHAIN_ID
+
+        config = self._config_for(update.effective_chat.id)
+        config.chain_id = new_chain_id
+        self.monitor_store.mark_dirty(config)
         await self._send_telegram_message(context, update.effective_chat.id,
-                                           f"✅ Chain ID updated to: {self.current_dexscreener_chain_id}. Restarting monitor to apply.")
+                                           f"✅ Chain ID updated to: {config.chain_id}. Restarting monitor to apply.")
         await self.start_command(update, context) # Restart monitor with new settings
         return ConversationHandler.END
 
@@ -382,8 +712,8 @@ class BlackholePriceBot:
         # Try to get chat_id from update first (for errors from direct user interactions)
         if update and update.effective_chat:
             chat_id_to_send_error = update.effective_chat.id
-        # If update is None (e.g., error from a JobQueue), try to get chat_id from job data
-        # context.job.data is reliable for jobs
+        # If update is None (e.g., error from a JobQueue), try to get chat_id from job data.
+        # The repeating jobs are not bound to chats and fall through to the admin chat.
         elif context.job and context.job.data and 'chat_id' in context.job.data:
             chat_id_to_send_error = context.job.data['chat_id']
         # Fallback to the predefined TELEGRAM_CHAT_ID if no specific chat_id can be determined
@@ -396,15 +726,55 @@ class BlackholePriceBot:
         else:
             logger.warning("Could not determine chat_id to send error message. Error was logged.")
 
-    def run(self):
-        """Starts the bot."""
+    def run(self, webhook_url: str = None, listen: str = "0.0.0.0", port: int = 8443,
+            url_path: str = "telegram", secret_token: str = None):
+        """Starts the bot. Receives updates through a webhook if `webhook_url` is set, by long polling otherwise."""
         logger.info("Bot starting...")
-        self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        if webhook_url:
+            if not secret_token:
+                # Telegram sends it back with every update; requests without it are rejected
+                secret_token = secrets.token_urlsafe(32)
+                logger.info("WEBHOOK_SECRET_TOKEN not set, using a random secret token for this run.")
+            logger.info(f"Receiving updates via webhook {webhook_url.rstrip('/')}/{url_path}, listening on {listen}:{port}.")
+            self.application.run_webhook(
+                listen=listen,
+                port=port,
+                url_path=url_path,
+                webhook_url=f"{webhook_url.rstrip('/')}/{url_path}",
+                secret_token=secret_token,
+                allowed_updates=self.ALLOWED_UPDATES,
+                # Let Telegram open no more connections than updates we process at once (it accepts 1-100)
+                max_connections=max(1, min(100, self.application.update_processor.concurrency_limit)),
+            )
+        else:
+            self.application.run_polling(allowed_updates=self.ALLOWED_UPDATES)
         logger.info("Bot stopped.")
 
 if __name__ == "__main__":
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
     TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID") # Used for initial setup/admin
+    MONITOR_DB_PATH = os.getenv("MONITOR_DB_PATH", "monitors.db") # Where per-chat monitors are persisted
+    DEXSCREENER_TIMEOUT_SECONDS = float(os.getenv("DEXSCREENER_TIMEOUT_SECONDS", "10")) # Deadline per request
+    DEXSCREENER_HEDGED_REQUESTS = os.getenv("DEXSCREENER_HEDGED_REQUESTS", "false").lower() in ("1", "true", "yes")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) or None # Prometheus endpoint, disabled if unset
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    DEXSCREENER_BASE_URL = os.getenv("DEXSCREENER_BASE_URL") # Defaults to the public API
+    TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL") # Defaults to https://api.telegram.org/bot
+    UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16")) # Updates of different chats processed at once
+    SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0")) # Worker processes started by the bot; 0 checks prices in-process
+    SHARD_SOCKET = os.getenv("SHARD_SOCKET") # Set to accept separately started workers (shard_worker.py)
+    SHARD_TOKEN = os.getenv("SHARD_TOKEN") # Shared with separately started workers; random per run if unset
+    # chain=websocket URL pairs, e.g. "avalanche=wss://api.avax.network/ext/bc/C/ws", for push prices from pool events
+    EVM_RPC_WS_URLS = {
+        chain_id.strip().lower(): url.strip()
+        for chain_id, url in (entry.split("=", 1) for entry in os.getenv("EVM_RPC_WS_URLS", "").split(",") if "=" in entry)
+    }
+    TICK_DIR = os.getenv("TICK_DIR") # Records every price per pair for replay.py, disabled if unset
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL") # Public https base URL; switches from polling to a webhook
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+    WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN") # Random per run if unset
 
     if not TELEGRAM_BOT_TOKEN:
         logger.error("TELEGRAM_BOT_TOKEN environment variable not set.")
@@ -413,5 +783,9 @@ if __name__ == "__main__":
     if not TELEGRAM_CHAT_ID:
         logger.warning("TELEGRAM_CHAT_ID environment variable not set. The bot will rely on chat_id from /start command for sending alerts.")
 
-    bot = BlackholePriceBot(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
-    bot.run()
\ No newline at end of file
+    bot = BlackholePriceBot(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, MONITOR_DB_PATH,
+                            DEXSCREENER_TIMEOUT_SECONDS, DEXSCREENER_HEDGED_REQUESTS,
+                            METRICS_PORT, METRICS_HOST, DEXSCREENER_BASE_URL, TELEGRAM_API_BASE_URL,
+                            UPDATE_CONCURRENCY, SHARD_WORKERS, SHARD_SOCKET, EVM_RPC_WS_URLS,
+                            TICK_DIR, SHARD_TOKEN)
+    bot.run(WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN)
\ No newline at end of file
@@ -0,0 +1,51 @@
+import bisect
+import hashlib
+
+
+def _hash(value: str) -> int:
+    # Stable across processes and restarts, unlike the built-in hash()
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping (chain_id, pair_address) keys to worker names.
+
+    Each worker is placed at `replicas` points on the ring; a key belongs to the first point
+    at or after its hash. Adding or removing a worker only moves the keys of the ring arcs
+    it gains or loses, about 1/N of them, so rebalancing leaves most pairs where they are.
+    """
+
+    def __init__(self, replicas: int = 64):
+        self.replicas = replicas
+        self._points = [] # sorted hashes
+        self._owners = [] # worker names, parallel to _points
+        self.nodes = set()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            index = bisect.bisect_left(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_for(self, key: tuple):
+        """The worker owning a key, None while the ring is empty."""
+        if not self._points:
+            return None
+        index = bisect.bisect_left(self._points, _hash(f"{key[0]}:{key[1]}"))
+        return self._owners[index % len(self._owners)]
@@ -0,0 +1,208 @@
+import asyncio
+import bisect
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers fast Telegram sends up to a Dexscreener request hitting its deadline
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Metrics are only ever updated from the event loop thread, so plain ints and lists are
+# safe without locks and an update stays a dict lookup plus an addition.
+
+
+def _escape_label(value) -> str:
+    # The text exposition format only allows these three escapes in label values
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+    def summarize(self) -> list:
+        if not self._values:
+            return [f"{self.name}: 0"]
+        return [f"{self.name}{_format_labels(self.label_names, label_values)}: {value:g}"
+                for label_values, value in sorted(self._values.items())]
+
+
+class Gauge:
+    """A gauge read from a callback at scrape time, so the hot path never updates it."""
+
+    def __init__(self, name: str, help_text: str, read):
+        self.name = name
+        self.help_text = help_text
+        self._read = read
+
+    def value(self) -> float:
+        return self._read()
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {self._read()}"]
+
+    def summarize(self) -> list:
+        return [f"{self.name}: {self._read()}"]
+
+
+class Histogram:
+    """Histogram with fixed bucket bounds: an observation is one bisect and two additions."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {} # label values -> [per-bucket counts (last is +Inf), sum]
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def snapshot(self, *label_values):
+        """(count, sum) of a series, (0, 0.0) if nothing was observed."""
+        series = self._series.get(label_values)
+        if series is None:
+            return 0, 0.0
+        return sum(series[0]), series[1]
+
+    def quantile(self, q: float, *label_values):
+        """Upper bound of the bucket holding the q-quantile, None if nothing was observed."""
+        series = self._series.get(label_values)
+        if series is None:
+            return None
+        counts = series[0]
+        rank = q * sum(counts)
+        cumulative = 0
+        for index, count in enumerate(counts):
+            cumulative += count
+            if count and cumulative >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return None
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def summarize(self) -> list:
+        if not self._series:
+            return [f"{self.name}: no samples"]
+        lines = []
+        for label_values in sorted(self._series):
+            count, total = self.snapshot(*label_values)
+            p95 = self.quantile(0.95, *label_values)
+            p95_text = f"<= {p95}s" if p95 != float("inf") else f"> {self.buckets[-1]}s"
+            lines.append(
+                f"{self.name}{_format_labels(self.label_names, label_values)}: "
+                f"{count} samples, mean {total / count:.3f}s, p95 {p95_text}"
+            )
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help_text: str, label_names: tuple = ()) -> Counter:
+        return self._register(Counter(name, help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, read) -> Gauge:
+        return self._register(Gauge(name, help_text, read))
+
+    def histogram(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Compact human-readable view, short enough for a Telegram message."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.summarize())
+        return "\n".join(lines)
+
+
+class MetricsServer:
+    """Minimal HTTP server answering GET /metrics with the registry's Prometheus text."""
+
+    def __init__(self, registry: MetricsRegistry, host: str, port: int):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Drain the headers; the request body, if any, is ignored
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logger.debug(f"Metrics request failed: {e!r}")
+        finally:
+            writer.close()
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+
+class MonitorConfig:
+    """Monitor settings and alert state of one chat. Slotted to keep tens of thousands of them small."""
+
+    __slots__ = (
+        'chat_id',
+        'chain_id',
+        'pair_address',
+        'price_lower',
+        'price_upper',
+        'check_interval',
+        'alert_cooldown',
+        'last_alert_time',
+        'last_fetch_error_alert',
+        'active',
+        'min_check_interval',
+        'rearm_margin',
+        'confirm_ticks',
+        'move_percent',
+        'move_window',
+        'last_move_alert_time',
+    )
+
+    def __init__(self, chat_id: int, chain_id: str, pair_address: str, price_lower: float, price_upper,
+                 check_interval: int, alert_cooldown: int, last_alert_time=None, last_fetch_error_alert=None,
+                 active: bool = False, min_check_interval=None, rearm_margin=None, confirm_ticks=None,
+                 move_percent=None, move_window=None, last_move_alert_time=None):
+        self.chat_id = chat_id
+        self.chain_id = chain_id
+        self.pair_address = pair_address
+        self.price_lower = price_lower
+        self.price_upper = price_upper # None disables the upper limit
+        self.check_interval = check_interval
+        self.alert_cooldown = alert_cooldown
+        self.last_alert_time = last_alert_time
+        self.last_fetch_error_alert = last_fetch_error_alert
+        self.active = active
+        self.min_check_interval = min_check_interval # None polls at a fixed check_interval
+        self.rearm_margin = rearm_margin # Percent inside the range the price must return to before the cooldown resets
+        self.confirm_ticks = confirm_ticks # Consecutive ticks outside the range before alerting; None alerts on the first
+        self.move_percent = move_percent # Alert on a move of this many percent within move_window; None disables
+        self.move_window = move_window # Seconds
+        self.last_move_alert_time = last_move_alert_time
+
+    @property
+    def interval_bounds(self) -> tuple:
+        """(min, max) poll interval; check_interval is the upper bound."""
+        if self.min_check_interval is None:
+            return self.check_interval, self.check_interval
+        return self.min_check_interval, self.check_interval
+
+    def as_row(self) -> tuple:
+        return tuple(getattr(self, column) for column in self.__slots__)
+
+
+# (column, SQL type) in MonitorConfig.__slots__ order. New columns are added to existing databases on open.
+_COLUMNS = (
+    ('chat_id', 'INTEGER PRIMARY KEY'),
+    ('chain_id', 'TEXT NOT NULL'),
+    ('pair_address', 'TEXT NOT NULL'),
+    ('price_lower', 'REAL NOT NULL'),
+    ('price_upper', 'REAL'),
+    ('check_interval', 'INTEGER NOT NULL'),
+    ('alert_cooldown', 'INTEGER NOT NULL'),
+    ('last_alert_time', 'REAL'),
+    ('last_fetch_error_alert', 'REAL'),
+    ('active', 'INTEGER NOT NULL DEFAULT 0'),
+    ('min_check_interval', 'INTEGER'),
+    ('rearm_margin', 'REAL'),
+    ('confirm_ticks', 'INTEGER'),
+    ('move_percent', 'REAL'),
+    ('move_window', 'INTEGER'),
+    ('last_move_alert_time', 'REAL'),
+)
+
+
+class MonitorStore:
+    """
+    Per-chat monitor configs kept in memory for the hot path and persisted write-behind to SQLite.
+
+    Changes only mark a config dirty. `flush` snapshots the dirty configs on the event loop
+    and writes them in one transaction on a worker thread, so the loop never waits on disk.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = None
+        self._configs = {}  # chat id -> MonitorConfig
+        self._dirty = set() # chat ids changed since the last flush
+        self._flush_lock = asyncio.Lock()
+
+    def open(self):
+        """Opens (or creates) the database in WAL mode and bulk-loads every stored config."""
+        # Flushes run on worker threads; the flush lock makes sure only one uses the connection at a time
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS monitors ({', '.join(f'{name} {sql_type}' for name, sql_type in _COLUMNS)})"
+        )
+        existing = {row[1] for row in self._connection.execute("PRAGMA table_info(monitors)")}
+        for name, sql_type in _COLUMNS:
+            if name not in existing:
+                self._connection.execute(f"ALTER TABLE monitors ADD COLUMN {name} {sql_type}")
+        self._connection.commit()
+
+        columns = ', '.join(name for name, _ in _COLUMNS)
+        for row in self._connection.execute(f"SELECT {columns} FROM monitors"):
+            config = MonitorConfig(*row)
+            config.active = bool(config.active)
+            self._configs[config.chat_id] = config
+        logger.info(f"Loaded {len(self._configs)} monitor config(s) from {self.path}.")
+
+    def get(self, chat_id: int):
+        return self._configs.get(chat_id)
+
+    def add(self, config: MonitorConfig) -> MonitorConfig:
+        self._configs[config.chat_id] = config
+        self._dirty.add(config.chat_id)
+        return config
+
+    def mark_dirty(self, config: MonitorConfig):
+        """Schedules a changed config to be written with the next flush."""
+        self._dirty.add(config.chat_id)
+
+    def active_configs(self) -> list:
+        return [config for config in self._configs.values() if config.active]
+
+    def __len__(self):
+        return len(self._configs)
+
+    async def flush(self):
+        """Writes every dirty config in a single transaction without blocking the event loop."""
+        if not self._dirty or self._connection is None or self._flush_lock.locked():
+            return
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = [self._configs[chat_id].as_row() for chat_id in dirty if chat_id in self._configs]
+            try:
+                await asyncio.to_thread(self._write_rows, rows)
+            except Exception as e:
+                # Keep the changes for the next attempt rather than losing them
+                self._dirty |= dirty
+                logger.error(f"Failed to persist {len(rows)} monitor config(s): {e}")
+            else:
+                logger.debug(f"Persisted {len(rows)} monitor config(s).")
+
+    def _write_rows(self, rows: list):
+        columns = ', '.join(name for name, _ in _COLUMNS)
+        placeholders = ', '.join('?' for _ in _COLUMNS)
+        with self._connection:
+            self._connection.executemany(f"INSERT OR REPLACE INTO monitors ({columns}) VALUES ({placeholders})", rows)
+
+    async def close(self):
+        """Flushes outstanding changes and closes the database."""
+        if self._connection is None:
+            return
+        async with self._flush_lock:
+            pass # Wait for a running flush to finish
+        await self.flush()
+        self._connection.close()
+        self._connection = None
@@ -0,0 +1,142 @@
+import bisect
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class RollingExtremes:
+    """
+    Minimum and maximum price of the last `seconds`, updated in amortized O(1) per tick.
+
+    Two monotonic deques of (timestamp, price): prices increase along `lows` and decrease
+    along `highs`, so the front of each is the window's extreme. A tick is appended once
+    and removed once, either when a later tick dominates it or when it ages out.
+    """
+
+    __slots__ = ('seconds', 'lows', 'highs')
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.lows = deque()
+        self.highs = deque()
+
+    def push(self, timestamp: float, price: float):
+        while self.lows and self.lows[-1][1] >= price:
+            self.lows.pop()
+        self.lows.append((timestamp, price))
+        while self.highs and self.highs[-1][1] <= price:
+            self.highs.pop()
+        self.highs.append((timestamp, price))
+        cutoff = timestamp - self.seconds
+        while self.lows[0][0] < cutoff:
+            self.lows.popleft()
+        while self.highs[0][0] < cutoff:
+            self.highs.popleft()
+
+    @property
+    def low(self) -> float:
+        return self.lows[0][1]
+
+    @property
+    def high(self) -> float:
+        return self.highs[0][1]
+
+
+class MoveWindow:
+    """The rules of one pair sharing a window length, sorted by their percent threshold."""
+
+    __slots__ = ('extremes', 'thresholds', 'ids', 'active', 'stale')
+
+    def __init__(self, seconds: float):
+        self.extremes = RollingExtremes(seconds)
+        self.thresholds = [] # sorted move_percent thresholds
+        self.ids = []        # chat ids, parallel to thresholds
+        self.active = set()  # chat ids whose threshold the current move reaches
+        self.stale = False   # rules were added or removed since the last tick
+
+
+class PairMoveEngine:
+    """
+    Evaluates the "moved X% within T" rules of one pair on each new price tick.
+
+    Rules sharing a window length share its rolling min/max, so a tick costs O(1) per
+    distinct window no matter how long the windows are. The move is the larger of the rise
+    from the window's low and the drop from its high. The rules it reaches form a prefix of
+    the sorted thresholds, so only rules whose threshold lies between the previous and the
+    new move change state: O(log n + k). A rule alerts when the move first reaches its
+    threshold, at most once per alert cooldown, and again after the move fell back below it.
+    """
+
+    def __init__(self):
+        self._rules = {}   # chat id -> MonitorConfig
+        self._keys = {}    # chat id -> (window seconds, threshold) as indexed
+        self._windows = {} # window seconds -> MoveWindow
+        self.suppressed = 0
+
+    def __len__(self):
+        return len(self._rules)
+
+    def add(self, config):
+        """Adds or re-indexes a chat's move rule; a config without one is removed."""
+        self.remove(config.chat_id)
+        if not config.move_percent or not config.move_window:
+            return
+        window = self._windows.get(config.move_window)
+        if window is None:
+            window = self._windows[config.move_window] = MoveWindow(config.move_window)
+        index = bisect.bisect_right(window.thresholds, config.move_percent)
+        window.thresholds.insert(index, config.move_percent)
+        window.ids.insert(index, config.chat_id)
+        window.stale = True
+        self._rules[config.chat_id] = config
+        self._keys[config.chat_id] = (config.move_window, config.move_percent)
+
+    def remove(self, chat_id: int):
+        if self._rules.pop(chat_id, None) is None:
+            return
+        seconds, threshold = self._keys.pop(chat_id)
+        window = self._windows[seconds]
+        index = bisect.bisect_left(window.thresholds, threshold)
+        while window.ids[index] != chat_id:
+            index += 1
+        del window.thresholds[index]
+        del window.ids[index]
+        window.active.discard(chat_id)
+        window.stale = True
+        if not window.ids:
+            del self._windows[seconds]
+
+    def evaluate(self, price: float, now: float) -> list:
+        """Feeds a new price. Returns (config, change percent, reference price) for every rule that fires."""
+        self.suppressed = 0
+        fired = []
+        for window in self._windows.values():
+            extremes = window.extremes
+            extremes.push(now, price)
+            rise = (price / extremes.low - 1) * 100 if extremes.low > 0 else 0.0
+            drop = (1 - price / extremes.high) * 100 if extremes.high > 0 else 0.0
+            change, reference = (rise, extremes.low) if rise >= drop else (-drop, extremes.high)
+            reached = bisect.bisect_right(window.thresholds, abs(change))
+
+            if window.stale:
+                active = set(window.ids[:reached])
+                newly_reached = active - window.active
+                window.active = active
+                window.stale = False
+            else:
+                # `active` is the prefix of ids up to the previous move's position
+                previous = len(window.active)
+                newly_reached = window.ids[previous:reached]
+                window.active.update(newly_reached)
+                window.active.difference_update(window.ids[reached:previous])
+
+            for chat_id in newly_reached:
+                config = self._rules[chat_id]
+                if config.last_move_alert_time is None or (now - config.last_move_alert_time) > config.alert_cooldown:
+                    config.last_move_alert_time = now
+                    fired.append((config, change, reference))
+                else:
+                    self.suppressed += 1
+                    logger.info(f"Price moved {change:+.2f}% for chat {chat_id}, but the move alert is still in cooldown.")
+        return fired
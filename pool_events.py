@@ -0,0 +1,272 @@
+import asyncio
+import itertools
+import logging
+import random
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# topic0 of the pool events that carry the new price
+SYNC_V2_TOPIC = "0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1"      # Sync(uint112,uint112)
+SYNC_SOLIDLY_TOPIC = "0xcf2aa50876cdfbb541206f89af0ee78d44a2abf8d328e37fa4917f982149848a" # Sync(uint256,uint256)
+SWAP_V3_TOPIC = "0xc42079f94a6350d7e6235f29174924f928cc2ac818eb64fed8004e115fbcca67"      # Swap(address,address,int256,int256,uint160,uint128,int24)
+SWAP_ALGEBRA_TOPIC = "0x121cb44ee54098b1a04743c487e7460d8dd429b27f88b1f4d4767396e1a59f79" # Same, plus uint24 overrideFee, uint24 pluginFee
+RESERVE_TOPICS = (SYNC_V2_TOPIC, SYNC_SOLIDLY_TOPIC)
+SQRT_PRICE_TOPICS = (SWAP_V3_TOPIC, SWAP_ALGEBRA_TOPIC)
+
+# eth_call selectors
+TOKEN0_SELECTOR = "0x0dfe1681"   # token0()
+TOKEN1_SELECTOR = "0xd21220a7"   # token1()
+DECIMALS_SELECTOR = "0x313ce567" # decimals()
+STABLE_SELECTOR = "0x22be3de1"   # stable(), only on Solidly-style pairs
+
+
+class RpcError(Exception):
+    pass
+
+
+def reserves_price(reserve0: int, reserve1: int, decimals0: int, decimals1: int, stable: bool = False) -> float:
+    """
+    Price of token0 in token1 from a pair's reserves. Constant-product pairs price at the
+    reserve ratio; Solidly stable pairs (x³y + y³x = k) at the curve's marginal rate.
+    """
+    x = reserve0 / 10 ** decimals0
+    y = reserve1 / 10 ** decimals1
+    if not x or not y:
+        return None
+    if stable:
+        return (3 * x * x * y + y ** 3) / (x ** 3 + 3 * x * y * y)
+    return y / x
+
+
+def sqrt_price_price(sqrt_price_x96: int, decimals0: int, decimals1: int) -> float:
+    """Price of token0 in token1 from a concentrated-liquidity pool's sqrtPriceX96."""
+    if not sqrt_price_x96:
+        return None
+    return (sqrt_price_x96 / 2 ** 96) ** 2 * 10 ** (decimals0 - decimals1)
+
+
+def _words(data: str) -> list:
+    data = data[2:] if data.startswith("0x") else data
+    return [int(data[i:i + 64], 16) for i in range(0, len(data), 64)]
+
+
+class PoolInfo:
+    """Token order, decimals and curve of one pool, read once over eth_call."""
+
+    __slots__ = ('base_is_token0', 'decimals0', 'decimals1', 'stable')
+
+    def __init__(self, base_is_token0: bool, decimals0: int, decimals1: int, stable: bool):
+        self.base_is_token0 = base_is_token0
+        self.decimals0 = decimals0
+        self.decimals1 = decimals1
+        self.stable = stable
+
+    def price_from_log(self, log: dict):
+        """price_native (base token in quote token) after the logged Sync or Swap, None for other events."""
+        topics = log.get("topics") or ()
+        if not topics:
+            return None
+        words = _words(log.get("data", "0x"))
+        if topics[0] in RESERVE_TOPICS and len(words) >= 2:
+            price = reserves_price(words[0], words[1], self.decimals0, self.decimals1, self.stable)
+        elif topics[0] in SQRT_PRICE_TOPICS and len(words) >= 3:
+            price = sqrt_price_price(words[2], self.decimals0, self.decimals1)
+        else:
+            return None
+        if price is None:
+            return None
+        return price if self.base_is_token0 else 1 / price
+
+
+class PoolEventSource:
+    """
+    Pushes pool prices of one EVM chain from a JSON-RPC websocket.
+
+    Every watched pool gets an eth_subscribe("logs") for its Sync and Swap events, and each
+    event's price goes to `on_price(chain_id, pair_address, price)` as soon as it arrives.
+    `on_live(chain_id, pair_address, live)` reports when a pool's subscription is up, and when
+    it is lost because the socket dropped, so the owner can pause and resume polling.
+    The socket reconnects with jittered exponential backoff and resubscribes every pool.
+    """
+
+    def __init__(self, chain_id: str, ws_url: str, on_price, on_live, request_timeout: float = 10,
+                 heartbeat: float = 15, max_reconnect_delay: float = 30):
+        self.chain_id = chain_id
+        self.ws_url = ws_url
+        self.on_price = on_price
+        self.on_live = on_live
+        self.request_timeout = request_timeout
+        self.heartbeat = heartbeat
+        self.max_reconnect_delay = max_reconnect_delay
+        self._watched = {}       # pair address -> base token address
+        self._pools = {}         # pair address -> PoolInfo
+        self._subscriptions = {} # subscription id -> pair address
+        self._live = {}          # pair address -> subscription id
+        self._pending = {}       # request id -> Future awaiting the response
+        self._request_ids = itertools.count(1)
+        self._ws = None
+        self._task = None
+        self._tasks = set()
+        self._stopping = False
+
+    def is_live(self, pair_address: str) -> bool:
+        return pair_address in self._live
+
+    def watch(self, pair_address: str, base_token_address: str):
+        """Subscribes to a pool's events; `base_token_address` tells which side price_native is quoted for."""
+        if pair_address in self._watched:
+            return
+        self._watched[pair_address] = base_token_address.lower()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"pool_events_{self.chain_id}")
+        elif self._ws is not None and not self._ws.closed:
+            self._spawn(self._subscribe(pair_address))
+
+    def unwatch(self, pair_address: str):
+        self._watched.pop(pair_address, None)
+        subscription = self._live.pop(pair_address, None)
+        if subscription is not None:
+            self._subscriptions.pop(subscription, None)
+            if self._ws is not None and not self._ws.closed:
+                self._spawn(self._unsubscribe(subscription))
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _request(self, method: str, params: list):
+        ws = self._ws
+        if ws is None or ws.closed:
+            raise ConnectionError("websocket closed") # Dropped while a subscription was being set up
+        request_id = next(self._request_ids)
+        future = self._pending[request_id] = asyncio.get_running_loop().create_future()
+        try:
+            await ws.send_json({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+            return await asyncio.wait_for(future, self.request_timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _call(self, to: str, selector: str) -> int:
+        result = await self._request("eth_call", [{"to": to, "data": selector}, "latest"])
+        return int(result, 16) if result not in (None, "0x") else 0
+
+    async def _pool_info(self, pair_address: str, base: str) -> PoolInfo:
+        pool = self._pools.get(pair_address)
+        if pool is not None:
+            return pool
+        token0 = f"0x{await self._call(pair_address, TOKEN0_SELECTOR):040x}"
+        token1 = f"0x{await self._call(pair_address, TOKEN1_SELECTOR):040x}"
+        if base not in (token0, token1):
+            raise RpcError(f"base token {base} is neither token0 nor token1 of the pool")
+        decimals0 = await self._call(token0, DECIMALS_SELECTOR)
+        decimals1 = await self._call(token1, DECIMALS_SELECTOR)
+        try:
+            stable = bool(await self._call(pair_address, STABLE_SELECTOR))
+        except RpcError:
+            stable = False # Not a Solidly-style pair
+        pool = self._pools[pair_address] = PoolInfo(base == token0, decimals0, decimals1, stable)
+        return pool
+
+    async def _subscribe(self, pair_address: str):
+        base = self._watched.get(pair_address)
+        if base is None:
+            return
+        try:
+            await self._pool_info(pair_address, base)
+            subscription = await self._request("eth_subscribe", [
+                "logs", {"address": pair_address, "topics": [list(RESERVE_TOPICS + SQRT_PRICE_TOPICS)]}
+            ])
+        except (RpcError, asyncio.TimeoutError, ConnectionError, ValueError) as e:
+            logger.warning(f"Could not subscribe to {pair_address} on {self.chain_id}, it stays polled: {e!r}")
+            return
+        if pair_address not in self._watched:
+            self._spawn(self._unsubscribe(subscription)) # Unwatched while subscribing
+            return
+        self._subscriptions[subscription] = pair_address
+        self._live[pair_address] = subscription
+        self.on_live(self.chain_id, pair_address, True)
+
+    async def _unsubscribe(self, subscription: str):
+        try:
+            await self._request("eth_unsubscribe", [subscription])
+        except (RpcError, asyncio.TimeoutError, ConnectionError) as e:
+            logger.debug(f"eth_unsubscribe on {self.chain_id} failed: {e!r}")
+
+    def _handle(self, message: dict):
+        if message.get("method") == "eth_subscription":
+            params = message.get("params") or {}
+            pair_address = self._subscriptions.get(params.get("subscription"))
+            log = params.get("result") or {}
+            if pair_address is None or log.get("removed"):
+                return # Unsubscribed meanwhile, or undone by a reorg
+            price = self._pools[pair_address].price_from_log(log)
+            if price is not None:
+                self.on_price(self.chain_id, pair_address, price)
+            return
+        future = self._pending.get(message.get("id"))
+        if future is None or future.done():
+            return
+        if "error" in message:
+            future.set_exception(RpcError(message["error"].get("message", message["error"])))
+        else:
+            future.set_result(message.get("result"))
+
+    def _drop_subscriptions(self):
+        live = list(self._live)
+        self._live.clear()
+        self._subscriptions.clear()
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("websocket closed"))
+        if self._stopping:
+            return
+        for pair_address in live:
+            self.on_live(self.chain_id, pair_address, False)
+
+    async def _run(self):
+        delay = 1.0
+        try:
+            async with aiohttp.ClientSession() as session:
+                while True:
+                    try:
+                        async with session.ws_connect(self.ws_url, heartbeat=self.heartbeat) as ws:
+                            self._ws = ws
+                            logger.info(f"Connected to the {self.chain_id} RPC websocket, subscribing to {len(self._watched)} pool(s).")
+                            delay = 1.0
+                            for pair_address in list(self._watched):
+                                self._spawn(self._subscribe(pair_address))
+                            async for message in ws:
+                                if message.type == aiohttp.WSMsgType.TEXT:
+                                    try:
+                                        self._handle(message.json())
+                                    except Exception as e:
+                                        # A malformed frame or a failing price check must not end the subscription
+                                        logger.error(f"Could not handle a message from the {self.chain_id} RPC websocket: {e!r}")
+                                elif message.type == aiohttp.WSMsgType.ERROR:
+                                    break
+                        logger.warning(f"The {self.chain_id} RPC websocket closed.")
+                    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                        logger.warning(f"The {self.chain_id} RPC websocket failed: {e!r}")
+                    except Exception:
+                        logger.exception(f"Unexpected error on the {self.chain_id} RPC websocket, reconnecting.")
+                    finally:
+                        self._ws = None
+                        self._drop_subscriptions()
+                    # Jittered backoff; the pools are polled through Dexscreener meanwhile
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                    delay = min(self.max_reconnect_delay, delay * 2)
+        finally:
+            self._task = None # watch() starts a new one
+
+    async def stop(self):
+        self._stopping = True
+        tasks = list(self._tasks)
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def pair_key(chain_id: str, pair_address: str) -> tuple:
+    """Normalises a (chain, pair) so that differently-cased inputs share one feed."""
+    return (chain_id.strip().lower(), pair_address.strip().lower())
+
+
+class PriceFeed:
+    """
+    Shared price-feed layer keyed by (chain_id, pair_address).
+
+    Chats subscribe to a pair instead of fetching it themselves. The owner polls each
+    distinct pair once per tick through `get` and fans the result out to `subscribers`.
+    Concurrent `get`/`get_many` calls for the same pair share a single in-flight request.
+    """
+
+    def __init__(self, fetch, fetch_many=None):
+        # fetch: async callable (chain_id, pair_address) -> pair data or None
+        # fetch_many: async callable (chain_id, [pair_address]) -> {pair_address.lower(): pair data}
+        self._fetch = fetch
+        self._fetch_many = fetch_many
+        self._subscribers = {}  # (chain_id, pair_address) -> set of chat ids
+        self._chat_keys = {}    # chat id -> (chain_id, pair_address)
+        self._in_flight = {}    # (chain_id, pair_address) -> asyncio.Future
+
+    def subscribe(self, chat_id: int, chain_id: str, pair_address: str) -> tuple:
+        """
+        Subscribes a chat to a pair, moving it off any pair it watched before.
+        Returns (key, previous_key_now_empty) so the caller can drop jobs nobody needs.
+        """
+        key = pair_key(chain_id, pair_address)
+        emptied = None
+        previous = self._chat_keys.get(chat_id)
+        if previous is not None and previous != key:
+            emptied = self.unsubscribe(chat_id)
+        self._subscribers.setdefault(key, set()).add(chat_id)
+        self._chat_keys[chat_id] = key
+        return key, emptied
+
+    def unsubscribe(self, chat_id: int):
+        """Removes a chat's subscription. Returns the pair key if it has no subscribers left."""
+        key = self._chat_keys.pop(chat_id, None)
+        if key is None:
+            return None
+        chats = self._subscribers.get(key)
+        if chats is not None:
+            chats.discard(chat_id)
+            if not chats:
+                del self._subscribers[key]
+                return key
+        return None
+
+    def __len__(self):
+        return len(self._chat_keys)
+
+    def is_subscribed(self, chat_id: int) -> bool:
+        return chat_id in self._chat_keys
+
+    def key_for(self, chat_id: int):
+        return self._chat_keys.get(chat_id)
+
+    def subscribers(self, key: tuple) -> tuple:
+        """Snapshot of the chats watching a pair, safe to iterate while chats (un)subscribe."""
+        return tuple(self._subscribers.get(key, ()))
+
+    def keys(self) -> tuple:
+        return tuple(self._subscribers)
+
+    async def get(self, chain_id: str, pair_address: str):
+        """Fetches a pair, joining an already running request for the same pair if there is one."""
+        key = pair_key(chain_id, pair_address)
+        future = self._in_flight.get(key)
+        if future is not None:
+            logger.debug(f"Joining in-flight Dexscreener request for {key[1]} on {key[0]}.")
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._fetch(*key)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure nobody else joined does not log "exception never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def get_many(self, chain_id: str, pair_addresses) -> dict:
+        """
+        Fetches several pairs of one chain with a single multi-pair lookup.
+        Pairs that are already being fetched are joined instead of requested again.
+        Returns {key: pair data or None}.
+        """
+        if self._fetch_many is None:
+            raise RuntimeError("PriceFeed was created without a multi-pair fetch function.")
+
+        loop = asyncio.get_running_loop()
+        owned = {}
+        joined = {}
+        for pair_address in pair_addresses:
+            key = pair_key(chain_id, pair_address)
+            if key in owned or key in joined:
+                continue
+            future = self._in_flight.get(key)
+            if future is not None:
+                joined[key] = future
+            else:
+                future = loop.create_future()
+                self._in_flight[key] = future
+                owned[key] = future
+
+        results = {}
+        if owned:
+            chain = next(iter(owned))[0]
+            try:
+                fetched = await self._fetch_many(chain, [key[1] for key in owned])
+            except asyncio.CancelledError:
+                for future in owned.values():
+                    future.cancel()
+                raise
+            except Exception as e:
+                for future in owned.values():
+                    future.set_exception(e)
+                    future.exception()
+                raise
+            finally:
+                for key in owned:
+                    self._in_flight.pop(key, None)
+            for key, future in owned.items():
+                results[key] = fetched.get(key[1])
+                future.set_result(results[key])
+
+        for key, future in joined.items():
+            try:
+                results[key] = await asyncio.shield(future)
+            except Exception:
+                results[key] = None
+        return results
@@ -0,0 +1,154 @@
+from array import array
+from collections import deque
+
+
+class PriceRing:
+    """Fixed-capacity ring buffer of (timestamp, price) stored in two flat `array('d')`s."""
+
+    __slots__ = ('capacity', 'times', 'prices', 'next_seq')
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.prices = array('d', bytes(8 * capacity))
+        self.next_seq = 0 # Sequence number of the next sample; sample `seq` lives at seq % capacity
+
+    def __len__(self):
+        return min(self.next_seq, self.capacity)
+
+    @property
+    def oldest_seq(self) -> int:
+        return max(0, self.next_seq - self.capacity)
+
+    def append(self, timestamp: float, price: float) -> int:
+        seq = self.next_seq
+        index = seq % self.capacity
+        self.times[index] = timestamp
+        self.prices[index] = price
+        self.next_seq += 1
+        return seq
+
+    def time_at(self, seq: int) -> float:
+        return self.times[seq % self.capacity]
+
+    def price_at(self, seq: int) -> float:
+        return self.prices[seq % self.capacity]
+
+    def last(self, n: int) -> list:
+        """The newest `n` samples, oldest first."""
+        start = max(self.oldest_seq, self.next_seq - n)
+        return [(self.time_at(seq), self.price_at(seq)) for seq in range(start, self.next_seq)]
+
+
+class WindowStats:
+    """
+    Running statistics of the samples of a ring that fall within the last `seconds`.
+
+    Samples enter on append and leave when they age out of the window or get overwritten,
+    so every update is amortized O(1). Min and max come from monotonic deques of sequence
+    numbers, the mean from a running sum.
+    """
+
+    __slots__ = ('seconds', 'start_seq', 'total', 'min_seqs', 'max_seqs')
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.start_seq = 0 # Oldest sample still inside the window
+        self.total = 0.0
+        self.min_seqs = deque() # Increasing prices
+        self.max_seqs = deque() # Decreasing prices
+
+    def add(self, ring: PriceRing, seq: int):
+        price = ring.price_at(seq)
+        self.total += price
+        while self.min_seqs and ring.price_at(self.min_seqs[-1]) >= price:
+            self.min_seqs.pop()
+        self.min_seqs.append(seq)
+        while self.max_seqs and ring.price_at(self.max_seqs[-1]) <= price:
+            self.max_seqs.pop()
+        self.max_seqs.append(seq)
+
+    def evict(self, ring: PriceRing, now: float, keep_from_seq: int = 0):
+        """Drops samples older than the window, and samples before `keep_from_seq` that the ring is about to overwrite."""
+        cutoff = now - self.seconds
+        while self.start_seq < ring.next_seq and \
+                (self.start_seq < keep_from_seq or ring.time_at(self.start_seq) < cutoff):
+            self.total -= ring.price_at(self.start_seq)
+            if self.min_seqs and self.min_seqs[0] == self.start_seq:
+                self.min_seqs.popleft()
+            if self.max_seqs and self.max_seqs[0] == self.start_seq:
+                self.max_seqs.popleft()
+            self.start_seq += 1
+
+    def count(self, ring: PriceRing) -> int:
+        return ring.next_seq - self.start_seq
+
+    def summary(self, ring: PriceRing):
+        """min/max/mean/first/last and percent change over the window, None if it is empty."""
+        count = self.count(ring)
+        if count <= 0:
+            return None
+        first = ring.price_at(self.start_seq)
+        last = ring.price_at(ring.next_seq - 1)
+        return {
+            'count': count,
+            'min': ring.price_at(self.min_seqs[0]),
+            'max': ring.price_at(self.max_seqs[0]),
+            'mean': self.total / count,
+            'first': first,
+            'last': last,
+            'change_pct': (last - first) / first * 100 if first else 0.0,
+        }
+
+
+class PairHistory:
+    """Price history of one pair: a ring buffer plus incrementally maintained window statistics."""
+
+    __slots__ = ('ring', 'windows')
+
+    def __init__(self, capacity: int, windows):
+        self.ring = PriceRing(capacity)
+        self.windows = {seconds: WindowStats(seconds) for seconds in windows}
+
+    def append(self, timestamp: float, price: float):
+        ring = self.ring
+        # Once the ring is full the oldest sample gets overwritten; evict it while its price is still readable
+        keep_from_seq = ring.oldest_seq + 1 if ring.next_seq >= ring.capacity else 0
+        for stats in self.windows.values():
+            stats.evict(ring, timestamp, keep_from_seq)
+        seq = ring.append(timestamp, price)
+        for stats in self.windows.values():
+            stats.add(ring, seq)
+
+    def summary(self, seconds: float, now: float):
+        stats = self.windows[seconds]
+        stats.evict(self.ring, now)
+        return stats.summary(self.ring)
+
+
+class PriceHistory:
+    """Bounded in-memory price history for every watched pair, keyed by (chain_id, pair_address)."""
+
+    def __init__(self, capacity: int, windows):
+        self.capacity = capacity
+        self.windows = tuple(sorted(windows))
+        self._pairs = {}
+
+    def record(self, key: tuple, timestamp: float, price: float):
+        history = self._pairs.get(key)
+        if history is None:
+            history = self._pairs[key] = PairHistory(self.capacity, self.windows)
+        history.append(timestamp, price)
+
+    def get(self, key: tuple):
+        return self._pairs.get(key)
+
+    def last_time(self, key: tuple):
+        """Timestamp of the pair's newest sample, None if it has none."""
+        history = self._pairs.get(key)
+        if history is None or not history.ring.next_seq:
+            return None
+        return history.ring.time_at(history.ring.next_seq - 1)
+
+    def discard(self, key: tuple):
+        self._pairs.pop(key, None)
@@ -0,0 +1,490 @@
+import asyncio
+import datetime
+import html
+import logging
+import time
+
+from alert_engine import PairAlertEngine
+from batch_scheduler import BatchScheduler, stagger_offset
+from monitor_store import MonitorConfig
+from price_feed import PriceFeed
+from price_history import PriceHistory
+from resilience import CLOSED, OPEN, CircuitOpenError, ResilientFetcher
+from send_queue import PRIORITY_ALERT, PRIORITY_WARNING
+from tick_store import TickRecorder
+
+logger = logging.getLogger(__name__)
+
+FETCH_ERROR_MESSAGE = "⚠️ **Warning:** Could not fetch price data from Dexscreener. The monitor will retry."
+FETCH_RECOVERED_MESSAGE = "✅ Price data from Dexscreener is available again."
+
+# Chain ids used as metric labels and circuit breaker endpoints from the start. Chains come
+# from /setchain, so others only get their own once Dexscreener returned a pair for them;
+# until then they share "other", which keeps metric series and breakers bounded.
+KNOWN_CHAINS = frozenset({
+    "ethereum", "bsc", "polygon", "arbitrum", "optimism", "base", "avalanche", "fantom", "sonic",
+    "solana", "cronos", "linea", "zksync", "blast", "mantle", "scroll", "pulsechain", "sui", "ton",
+    "tron", "berachain", "unichain", "hyperevm",
+})
+OTHER_CHAIN = "other"
+
+
+def make_dexscreener_client(base_url: str = None):
+    from dexscreener import DexscreenerClient # Deferred: it pulls in pydantic and two HTTP stacks
+    client = DexscreenerClient()
+    if base_url:
+        # The client's HTTP clients are bound to the public API; re-point them, e.g. at the bench stand-in
+        for http_client in vars(client).values():
+            http_client.base_url = http_client.base_url.replace(DexscreenerClient.BASE_URL, base_url.rstrip("/"), 1)
+    return client
+
+
+class PriceMonitor:
+    """
+    Polls the watched pairs and evaluates every chat's price range, independent of Telegram.
+
+    Owns the shared price feed, the batch scheduler, one alert engine per pair, the price
+    history and the resilient Dexscreener fetcher. Messages for chats go out through
+    `send(chat_id, text, priority)`, configs whose alert state changed through `save(config)`.
+    The bot runs one in its own process; in sharded mode every worker runs one for its pairs.
+
+    On chains with a JSON-RPC websocket in `rpc_urls`, a pair is also subscribed to its pool's
+    Sync/Swap events once Dexscreener has identified its base token. While the subscription
+    is up, every event's price is checked right away and Dexscreener polling of the pair is
+    paused; when the socket drops, polling resumes until the subscription is back.
+    """
+
+    def __init__(self, dexscreener_base_url: str, metrics, send, save, batch_window: float = 5,
+                 history_capacity: int = 2880, history_windows: dict = None,
+                 request_timeout: float = 10, hedge_requests: bool = False, rpc_urls: dict = None,
+                 tick_dir: str = None):
+        self.dexscreener_base_url = dexscreener_base_url
+        self._dexscreener_client = None # Created on the first fetch, see dexscreener_client
+        self.send = send
+        self.save = save
+        self.history_windows = history_windows or {}
+        self._configs = {} # chat id -> MonitorConfig of every active monitor
+        # Circuit breaker per chain endpoint, strict deadlines, jittered retries and optional hedging
+        self.resilient_fetcher = ResilientFetcher(
+            timeout=request_timeout,
+            hedge=hedge_requests,
+            on_state_change=self._on_breaker_state_change
+        )
+        self._outage_chats = {} # endpoint -> chat ids warned about its current outage
+        # One fetch per (chain, pair) per tick, shared by every chat watching that pair
+        self.price_feed = PriceFeed(self._get_dex_pair_data, self._get_dex_pairs_data)
+        # Decides which pairs are due and groups them into multi-pair Dexscreener requests
+        self.batch_scheduler = BatchScheduler(batch_window)
+        # (chain_id, pair_address) -> index of every subscribed chat's range on that pair
+        self.alert_engines = {}
+        # Constant-size price history per watched pair for /history and trend context in alerts
+        self.price_history = PriceHistory(history_capacity, self.history_windows.values())
+        # Every price is checked, but samples are kept at most this often so the ring spans the longest window
+        self.history_spacing = max(self.history_windows.values(), default=0) / history_capacity
+        # chain id -> on-chain event source for the chains with an RPC websocket
+        self.event_sources = {}
+        if rpc_urls:
+            from pool_events import PoolEventSource # Only imported with push prices configured
+            self.event_sources = {
+                chain_id: PoolEventSource(chain_id, url, self._on_pushed_price, self._on_push_state)
+                for chain_id, url in rpc_urls.items()
+            }
+        self._live = set()      # (chain_id, pair_address) currently priced from pool events
+        self._last_pairs = {}   # (chain_id, pair_address) -> last Dexscreener pair data, for alert details
+        self._known_chains = set(KNOWN_CHAINS) | set(self.event_sources) # Chains labelled by name, see KNOWN_CHAINS
+        # Every evaluated price, kept per pair for offline replays of alert rules (replay.py)
+        self.tick_recorder = TickRecorder(tick_dir) if tick_dir else None
+        self._tasks = set()
+
+        self.fetch_latency = metrics.histogram(
+            "dexscreener_request_seconds", "Latency of Dexscreener requests, including retries.", ("chain",))
+        self.fetch_errors = metrics.counter(
+            "dexscreener_fetch_errors_total", "Pairs whose price could not be fetched.", ("chain", "reason"))
+        self.alerts_sent = metrics.counter(
+            "alerts_total", "Price alerts sent.", ("chain",))
+        self.alerts_suppressed = metrics.counter(
+            "alerts_suppressed_total", "Price alerts held back by the alert cooldown.", ("chain",))
+        self.move_alerts_sent = metrics.counter(
+            "move_alerts_total", "Percent-move alerts sent.", ("chain",))
+        self.pushed_prices = metrics.counter(
+            "pool_event_prices_total", "Prices received from on-chain pool events.", ("chain",))
+        metrics.gauge("live_pairs", "Pairs priced from on-chain pool events instead of polling.", lambda: len(self._live))
+
+    def __len__(self):
+        return len(self.price_feed)
+
+    @property
+    def dexscreener_client(self):
+        """
+        The Dexscreener client, created on first use. Importing it is the slowest part of
+        startup, so it happens on the first poll instead of before the bot starts taking updates.
+        """
+        if self._dexscreener_client is None:
+            self._dexscreener_client = make_dexscreener_client(self.dexscreener_base_url)
+        return self._dexscreener_client
+
+    @property
+    def watched_pairs(self) -> int:
+        return len(self.batch_scheduler)
+
+    def is_active(self, chat_id: int) -> bool:
+        return self.price_feed.is_subscribed(chat_id)
+
+    def key_for(self, chat_id: int):
+        return self.price_feed.key_for(chat_id)
+
+    def add(self, config: MonitorConfig, stagger: bool = False):
+        """
+        Starts monitoring a chat's configured pair, or applies its changed settings.
+        A chat joining a pair that is already polled gets one check right away. On a pair priced
+        from pool events, new and changed rules are checked against the last pushed price at once.
+
+        With `stagger`, used for the monitors restored in bulk at startup, a newly polled
+        pair's first check is spread across its interval (see stagger_offset) instead of going
+        out with the next batch, and joining chats wait for the pair's regular check.
+        """
+        self._configs[config.chat_id] = config
+        previous_key = self.price_feed.key_for(config.chat_id)
+        key, _ = self.price_feed.subscribe(config.chat_id, config.chain_id, config.pair_address)
+        already_polled = self.batch_scheduler.is_scheduled(key) or key in self._live
+        if previous_key is not None and previous_key != key:
+            self.alert_engines[previous_key].remove(config.chat_id)
+            self._reschedule_pair(previous_key)
+        self.alert_engines.setdefault(key, PairAlertEngine()).add(config)
+        self._reschedule_pair(key, stagger)
+        if key in self._live:
+            self._check_live_pair(key)
+        elif already_polled and previous_key != key and not stagger:
+            self._spawn(self._check_new_subscriber(config.chat_id), f"price_check_{config.chat_id}")
+        logger.info(f"Chat {config.chat_id} subscribed to {key[1]} on {key[0]} "
+                    f"({len(self.price_feed.subscribers(key))} chat(s) watching).")
+
+    def remove(self, chat_id: int):
+        key = self.price_feed.key_for(chat_id)
+        self.price_feed.unsubscribe(chat_id)
+        self._configs.pop(chat_id, None)
+        if key is not None:
+            self.alert_engines[key].remove(chat_id)
+            self._reschedule_pair(key)
+
+    def _reschedule_pair(self, key: tuple, stagger: bool = False):
+        """
+        Polls a pair within the tightest interval bounds any of its chats asked for,
+        or stops polling it if nobody watches it.
+        """
+        bounds = [self._configs[chat_id].interval_bounds for chat_id in self.price_feed.subscribers(key)]
+        if not bounds:
+            self.batch_scheduler.unschedule(key)
+            self.alert_engines.pop(key, None)
+            self.price_history.discard(key)
+            self._last_pairs.pop(key, None)
+            self._live.discard(key)
+            if key[0] in self.event_sources:
+                self.event_sources[key[0]].unwatch(key[1])
+            logger.info(f"Stopped polling {key[1]} on {key[0]}, no chats are watching it.")
+            return
+        if key in self._live:
+            return # Priced from pool events; polling resumes if the subscription drops
+        min_interval = min(lower for lower, _ in bounds)
+        max_interval = max(min_interval, min(upper for _, upper in bounds))
+        # First check goes out with the next batch window, or at the pair's offset when staggered
+        first = stagger_offset(key, min_interval) if stagger else 0
+        self.batch_scheduler.schedule(key, min_interval, max_interval, datetime.datetime.now().timestamp(), first)
+
+    async def current_interval(self, chat_id: int):
+        """The interval the chat's pair is currently polled at, None if it is not monitored."""
+        key = self.price_feed.key_for(chat_id)
+        return self.batch_scheduler.interval_for(key) if key is not None else None
+
+    async def history(self, chat_id: int, windows: dict, last_n: int):
+        """
+        Statistics of the chat's pair for each {label: seconds} window and its newest `last_n`
+        prices, as {'key', 'windows': {label: summary or None}, 'last': [(timestamp, price)]}.
+        None if the chat has no history.
+        """
+        key = self.price_feed.key_for(chat_id)
+        history = self.price_history.get(key) if key is not None else None
+        if history is None:
+            return None
+        now = datetime.datetime.now().timestamp()
+        return {
+            'key': key,
+            'windows': {label: history.summary(seconds, now) for label, seconds in windows.items()},
+            'last': history.ring.last(last_n),
+        }
+
+    def _spawn(self, coroutine, name: str):
+        task = asyncio.create_task(coroutine, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Price monitor task {task.get_name()} failed.", exc_info=task.exception())
+
+    async def stop(self):
+        for source in self.event_sources.values():
+            await source.stop()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.tick_recorder is not None:
+            await self.tick_recorder.close()
+
+    def _on_push_state(self, chain_id: str, pair_address: str, live: bool):
+        """Pauses polling of a pair while its pool events arrive, and resumes it when they stop."""
+        key = (chain_id, pair_address)
+        if key not in self.alert_engines:
+            return
+        if live:
+            self._live.add(key)
+            self.batch_scheduler.unschedule(key)
+            logger.info(f"Pricing {pair_address} on {chain_id} from pool events, Dexscreener polling paused.")
+        elif key in self._live:
+            self._live.discard(key)
+            self._reschedule_pair(key)
+            logger.warning(f"Lost the pool events of {pair_address} on {chain_id}, falling back to Dexscreener polling.")
+
+    def _on_pushed_price(self, chain_id: str, pair_address: str, price: float):
+        """Checks a price from a pool event; the symbols and links of the alert come from the last Dexscreener data."""
+        key = (chain_id, pair_address)
+        pairs_data = self._last_pairs.get(key)
+        if pairs_data is None:
+            return
+        self.pushed_prices.inc(self._chain_label(chain_id))
+        self._check_price(key, pairs_data.model_copy(update={'price_native': price}), pushed=True)
+
+    def _chain_label(self, chain_id: str) -> str:
+        return chain_id if chain_id in self._known_chains else OTHER_CHAIN
+
+    def _dex_endpoint(self, chain_id: str) -> str:
+        return f"dexscreener:{self._chain_label(chain_id)}"
+
+    def _on_breaker_state_change(self, breaker, old_state: str, new_state: str):
+        """Warns the chats on a chain once when its Dexscreener endpoint goes down, and once when it recovers."""
+        chain_label = breaker.name.split(":", 1)[1]
+        if old_state == CLOSED and new_state == OPEN:
+            chat_ids = {
+                chat_id
+                for key in self.price_feed.keys() if self._chain_label(key[0]) == chain_label
+                for chat_id in self.price_feed.subscribers(key)
+            }
+            self._outage_chats[breaker.name] = chat_ids
+            for chat_id in chat_ids:
+                self.send(chat_id, FETCH_ERROR_MESSAGE, PRIORITY_WARNING)
+        elif new_state == CLOSED:
+            for chat_id in self._outage_chats.pop(breaker.name, ()):
+                if self.price_feed.is_subscribed(chat_id):
+                    self.send(chat_id, FETCH_RECOVERED_MESSAGE, PRIORITY_WARNING)
+
+    async def _get_dex_pair_data(self, chain_id: str, pair_address: str):
+        """
+        Fetches the pair data from Dexscreener.
+        Returns the pair data object or None if an error occurs or no data is found.
+        """
+        started = time.perf_counter()
+        try:
+            pairs_data = await self.resilient_fetcher.call(
+                self._dex_endpoint(chain_id),
+                lambda: self.dexscreener_client.get_token_pair_async(chain_id, pair_address)
+            )
+            self.fetch_latency.observe(time.perf_counter() - started, self._chain_label(chain_id))
+
+            if pairs_data and pairs_data.base_token and pairs_data.quote_token:
+                logger.info(f"Successfully fetched data for {pairs_data.base_token.symbol}/{pairs_data.quote_token.symbol} on {chain_id}.")
+                return pairs_data
+            else:
+                logger.warning(f"No data found for pair {pair_address} on chain {chain_id}.")
+                self.fetch_errors.inc(self._chain_label(chain_id), "missing")
+                return None
+        except CircuitOpenError:
+            logger.debug(f"Skipping Dexscreener request for {pair_address} on {chain_id}, the endpoint is failing.")
+            self.fetch_errors.inc(self._chain_label(chain_id), "circuit_open")
+            return None
+        except Exception as e:
+            self.fetch_latency.observe(time.perf_counter() - started, self._chain_label(chain_id))
+            logger.error(f"An error occurred while fetching Dexscreener data for {pair_address} on {chain_id}: {e!r}")
+            self.fetch_errors.inc(self._chain_label(chain_id), "error")
+            return None
+
+    async def _get_dex_pairs_data(self, chain_id: str, pair_addresses: list):
+        """
+        Fetches up to 30 pairs of one chain with a single Dexscreener request.
+        Returns {lowercased pair address: pair data}; pairs that are missing or failed are left out.
+        """
+        started = time.perf_counter()
+        try:
+            pairs = await self.resilient_fetcher.call(
+                self._dex_endpoint(chain_id),
+                lambda: self.dexscreener_client.get_token_pair_list_async(chain_id, pair_addresses)
+            )
+        except CircuitOpenError:
+            logger.debug(f"Skipping Dexscreener request for {len(pair_addresses)} pairs on {chain_id}, the endpoint is failing.")
+            self.fetch_errors.inc(self._chain_label(chain_id), "circuit_open", amount=len(pair_addresses))
+            return {}
+        except Exception as e:
+            self.fetch_latency.observe(time.perf_counter() - started, self._chain_label(chain_id))
+            logger.error(f"An error occurred while fetching Dexscreener data for {len(pair_addresses)} pairs on {chain_id}: {e!r}")
+            self.fetch_errors.inc(self._chain_label(chain_id), "error", amount=len(pair_addresses))
+            return {}
+        self.fetch_latency.observe(time.perf_counter() - started, self._chain_label(chain_id))
+
+        pairs_by_address = {
+            pair.pair_address.lower(): pair
+            for pair in pairs
+            if pair.base_token and pair.quote_token
+        }
+        logger.info(f"Successfully fetched data for {len(pairs_by_address)}/{len(pair_addresses)} pairs on {chain_id}.")
+        missing = len(pair_addresses) - len(pairs_by_address)
+        if missing:
+            logger.warning(f"No data found for {missing} pair(s) on chain {chain_id}.")
+            self.fetch_errors.inc(self._chain_label(chain_id), "missing", amount=missing)
+        return pairs_by_address
+
+    def poll(self):
+        """Collects the pairs due in this window and polls them in multi-pair chunks spread across it."""
+        if self.tick_recorder is not None:
+            self.tick_recorder.flush()
+        chunks = self.batch_scheduler.take_due(datetime.datetime.now().timestamp())
+        if not chunks:
+            return
+
+        logger.info(f"Polling {sum(len(addresses) for _, addresses in chunks)} pair(s) in {len(chunks)} request(s).")
+        # Run chunks as separate tasks so a slow request never makes the poll loop overrun its window
+        for (chain_id, pair_addresses), delay in zip(chunks, self.batch_scheduler.chunk_delays(len(chunks))):
+            self._spawn(self._poll_chunk(chain_id, pair_addresses, delay), f"price_feed_chunk_{chain_id}")
+
+    async def _poll_chunk(self, chain_id: str, pair_addresses: list, delay: float):
+        """Fetches one chunk of pairs and runs the alert check for every chat watching them."""
+        if delay:
+            await asyncio.sleep(delay)
+        results = await self.price_feed.get_many(chain_id, pair_addresses)
+        for key, pairs_data in results.items():
+            self._check_price(key, pairs_data)
+
+    async def _check_new_subscriber(self, chat_id: int):
+        """Checks the price once right away for a chat that joined an already polled pair."""
+        key = self.price_feed.key_for(chat_id)
+        if key is None:
+            return
+        pairs_data = await self.price_feed.get(*key)
+        if key in self._live:
+            # Went live meanwhile; the fetched price may lag the pushed ones
+            self._check_live_pair(key)
+            return
+        # Only rules added since the last tick or crossed by this price are evaluated
+        self._check_price(key, pairs_data)
+
+    def _check_live_pair(self, key: tuple):
+        """
+        Evaluates the new or changed rules of a pair priced from pool events against its last
+        pushed price, instead of waiting for the next event or fetching a lagging Dexscreener price.
+        """
+        engine = self.alert_engines.get(key)
+        pairs_data = self._last_pairs.get(key)
+        if engine is None or engine.last_price is None or pairs_data is None:
+            return
+        self._check_price(key, pairs_data.model_copy(update={'price_native': engine.last_price}), pushed=True)
+
+    def _check_price(self, key: tuple, pairs_data, pushed: bool = False):
+        """
+        Feeds a fetched or pushed price to the pair's alert engine and sends alerts to the
+        chats whose range it left.
+        """
+        engine = self.alert_engines.get(key)
+        if engine is None:
+            return # Nobody watches the pair anymore
+
+        if not pairs_data:
+            logger.warning("Skipping price check due to previous data fetching error.")
+            if self.resilient_fetcher.breaker(self._dex_endpoint(key[0])).consecutive_failures:
+                return # Requests are failing; the circuit breaker warns once per outage instead of every tick
+            # The request worked but the pair is missing, e.g. a wrong pair address or chain
+            for chat_id in self.price_feed.subscribers(key):
+                self._send_fetch_error_alert(self._configs[chat_id])
+            return
+
+        current_price_native = float(pairs_data.price_native)
+        logger.log(logging.DEBUG if pushed else logging.INFO,
+                   f"{pairs_data.base_token.symbol}/{pairs_data.quote_token.symbol} - Current Price {pairs_data.quote_token.symbol}: ${current_price_native:.6f} ({len(engine)} chat(s) watching)")
+
+        current_time = datetime.datetime.now().timestamp()
+        if self.tick_recorder is not None:
+            self.tick_recorder.record(key, current_time, current_price_native)
+        if not pushed:
+            self._last_pairs[key] = pairs_data
+            self._known_chains.add(key[0]) # Dexscreener knows the chain, so it gets its own label
+            source = self.event_sources.get(key[0])
+            if source is not None:
+                source.watch(key[1], pairs_data.base_token.address)
+        last_time = self.price_history.last_time(key)
+        if last_time is None or current_time - last_time >= self.history_spacing:
+            self.price_history.record(key, current_time, current_price_native)
+        alerts, resets = engine.evaluate(current_price_native, current_time)
+        if alerts:
+            self.alerts_sent.inc(self._chain_label(key[0]), amount=len(alerts))
+        if engine.move_alerts:
+            self.move_alerts_sent.inc(self._chain_label(key[0]), amount=len(engine.move_alerts))
+        if engine.suppressed:
+            self.alerts_suppressed.inc(self._chain_label(key[0]), amount=engine.suppressed)
+        # Poll sooner when the price is near a threshold or moving fast, later when it is calm
+        interval = self.batch_scheduler.record_price(
+            key, current_price_native, engine.nearest_threshold_distance(current_price_native), current_time
+        )
+        if interval is not None:
+            logger.info(f"Next check of {key[1]} on {key[0]} in {interval:.0f} seconds.")
+        for config in resets:
+            # Also clear the fetch error alert if price is back to normal
+            config.last_fetch_error_alert = None
+            self.save(config)
+        trend = self._format_trend(key, current_time) if alerts else ""
+        # Dexscreener's symbols and names go into HTML messages; one stray '<' or '&' would get
+        # the message, and every alert merged with it, rejected by Telegram
+        symbol = html.escape(pairs_data.base_token.symbol or "")
+        pool = (
+            f"Pool: <a href='{html.escape(pairs_data.url or '')}'>{symbol}/{html.escape(pairs_data.quote_token.symbol or '')} "
+            f"on {html.escape(pairs_data.dex_id or '')}</a>\n"
+            f"Chain: {html.escape((pairs_data.chain_id or '').capitalize())}"
+        ) if alerts or engine.move_alerts else ""
+        for config in alerts:
+            message = (
+                f"🚨 **PRICE ALERT!** 🚨\n\n"
+                f"The price of {symbol} got out of Range ${config.price_lower} - {config.price_upper}!\n"
+                f"Current Price: **${current_price_native:.6f} USD**\n"
+                f"{pool}"
+                f"{trend}"
+            )
+            self.send(config.chat_id, message, PRIORITY_ALERT)
+            self.save(config) # The engine updated last_alert_time
+        for config, change, reference in engine.move_alerts:
+            message = (
+                f"{'📈' if change > 0 else '📉'} **PRICE MOVE ALERT!**\n\n"
+                f"The price of {symbol} moved {change:+.2f}% within {config.move_window // 60} minutes "
+                f"(from ${reference:.6f} to ${current_price_native:.6f}).\n"
+                f"{pool}"
+            )
+            self.send(config.chat_id, message, PRIORITY_ALERT)
+            self.save(config) # The engine updated last_move_alert_time
+
+    def _format_trend(self, key: tuple, now: float) -> str:
+        """Percent change of the pair over each history window, as an extra line for alerts."""
+        history = self.price_history.get(key)
+        changes = []
+        for label, seconds in self.history_windows.items():
+            summary = history.summary(seconds, now)
+            if summary is None or summary['count'] < 2:
+                continue
+            changes.append(f"{label} {summary['change_pct']:+.3f}%")
+        return f"\nTrend: {', '.join(changes)}" if changes else ""
+
+    def _send_fetch_error_alert(self, config: MonitorConfig):
+        """Warns a chat that the price could not be fetched, at most once per alert cooldown."""
+        current_time = datetime.datetime.now().timestamp()
+        if config.last_fetch_error_alert is None or \
+           (current_time - config.last_fetch_error_alert) > config.alert_cooldown: # Use alert_cooldown for this too
+            self.send(config.chat_id, FETCH_ERROR_MESSAGE, PRIORITY_WARNING)
+            config.last_fetch_error_alert = current_time
+            self.save(config)
+        else:
+            logger.debug("Skipping fetch error alert due to cooldown.")
@@ -0,0 +1,193 @@
+"""
+Replays recorded price ticks (see TICK_DIR) against candidate alert rules.
+
+    python replay.py ticks/avalanche_0x859592a4....ticks --range "1.0002 - 1.0003" --range "1.0001 - none" \
+        --cooldown 60 --cooldown 300
+
+For every combination of range and cooldown it reports how many alerts the bot would have
+sent over the recorded history, how many separate times the price left the range and the
+share of ticks outside it. Alerts follow the bot's rules exactly: one when the price leaves
+the range, another each time the cooldown has fully passed (strictly more than
+`alert_cooldown` seconds) while it stays outside, and the cooldown resets as soon as a tick
+is back inside.
+
+The tick file is memory-mapped and evaluated with NumPy: outside-the-range episodes come
+from one vectorized comparison, and re-alerts within an episode jump from cooldown to
+cooldown with a binary search instead of visiting every tick. Without NumPy, or with
+--verify, the ticks are fed through the bot's own PairAlertEngine instead, which is exact
+but much slower.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+from alert_engine import PairAlertEngine
+from monitor_store import MonitorConfig
+from tick_store import TICK_RECORD, read_ticks
+
+try:
+    import numpy as np
+except ImportError: # Only needed for the fast path
+    np = None
+
+TICK_DTYPE = None if np is None else np.dtype([('timestamp', '<f8'), ('price', '<f8')])
+
+
+def parse_range(text: str) -> tuple:
+    """'lower - upper' like /setrange; an upper of 'none' or 0 disables the upper limit."""
+    parts = [part.strip() for part in text.split('-')]
+    if len(parts) != 2:
+        raise argparse.ArgumentTypeError(f"expected 'lower - upper', got {text!r}")
+    try:
+        lower = float(parts[0])
+        upper = None if parts[1].lower() in ('0', 'none') else float(parts[1])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid price in {text!r}")
+    if lower <= 0 or (upper is not None and upper < lower):
+        raise argparse.ArgumentTypeError(f"invalid range {text!r}")
+    return lower, upper
+
+
+def load_ticks(path: str) -> tuple:
+    """(timestamps, prices) of a tick file as NumPy arrays read through a memory map."""
+    count = os.path.getsize(path) // TICK_RECORD.size # A torn last record is ignored
+    if not count:
+        return np.empty(0), np.empty(0)
+    ticks = np.memmap(path, dtype=TICK_DTYPE, mode='r', shape=(count,))
+    return np.ascontiguousarray(ticks['timestamp']), np.ascontiguousarray(ticks['price'])
+
+
+def replay_vectorized(timestamps, prices, lower: float, upper, cooldown: float) -> dict:
+    outside = prices < lower
+    if upper is not None:
+        outside |= prices > upper
+    edges = np.diff(outside.view(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1) # First tick of each episode outside the range
+    ends = np.flatnonzero(edges == -1)  # First tick back inside (or the end)
+
+    # Every episode alerts on its first tick: the cooldown was reset by the tick before it
+    alerts = len(starts)
+    # Re-alerts only happen in episodes that outlast the cooldown
+    for episode in np.flatnonzero(timestamps[ends - 1] - timestamps[starts] > cooldown):
+        index, end = starts[episode], ends[episode]
+        while True:
+            alerted_at = timestamps[index]
+            # The live engine re-checks a rule once its cooldown expiry (alerted_at + cooldown) is
+            # strictly in the past, then alerts if now - alerted_at > cooldown; both must hold
+            index = index + 1 + np.searchsorted(timestamps[index + 1:end], alerted_at + cooldown, side='right')
+            while index < end and not timestamps[index] - alerted_at > cooldown:
+                index += 1
+            if index >= end:
+                break
+            alerts += 1
+    return {'alerts': int(alerts), 'episodes': len(starts), 'outside_ticks': int(np.count_nonzero(outside))}
+
+
+def replay_engine(ticks, lower: float, upper, cooldown: float) -> dict:
+    """Feeds the ticks through PairAlertEngine, the reference for replay_vectorized."""
+    config = MonitorConfig(0, "replay", "replay", lower, upper, 0, cooldown)
+    engine = PairAlertEngine()
+    engine.add(config)
+    alerts = episodes = outside_ticks = 0
+    was_outside = False
+    for timestamp, price in ticks:
+        sent, _ = engine.evaluate(price, timestamp)
+        alerts += len(sent)
+        outside = PairAlertEngine.is_outside(config, price)
+        outside_ticks += outside
+        episodes += outside and not was_outside
+        was_outside = outside
+    return {'alerts': alerts, 'episodes': episodes, 'outside_ticks': outside_ticks}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Count the alerts candidate ranges and cooldowns would have sent over recorded ticks.")
+    parser.add_argument("tick_files", nargs="+", help="Tick files written by the bot (TICK_DIR).")
+    parser.add_argument("--range", dest="ranges", action="append", type=parse_range, required=True,
+                        help="Candidate range as 'lower - upper' or 'lower - none'. Repeat to compare several.")
+    parser.add_argument("--cooldown", dest="cooldowns", action="append", type=float,
+                        help="Candidate alert cooldown in seconds. Repeat to compare several (default 300).")
+    parser.add_argument("--since", type=float, help="Only replay ticks at or after this Unix timestamp.")
+    parser.add_argument("--until", type=float, help="Only replay ticks before this Unix timestamp.")
+    parser.add_argument("--verify", action="store_true", help="Also run the reference engine and fail on any difference.")
+    parser.add_argument("--json", dest="json_path", help="Also write the results as JSON to this file.")
+    return parser.parse_args()
+
+
+def replay_file(path: str, configs: list, since, until, verify: bool) -> dict:
+    started = time.perf_counter()
+    if np is not None:
+        timestamps, prices = load_ticks(path)
+        window = slice(
+            None if since is None else np.searchsorted(timestamps, since, side='left'),
+            None if until is None else np.searchsorted(timestamps, until, side='left'),
+        )
+        timestamps, prices = timestamps[window], prices[window]
+        tick_count = len(timestamps)
+        span = (float(timestamps[0]), float(timestamps[-1])) if tick_count else None
+        results = [replay_vectorized(timestamps, prices, lower, upper, cooldown) for (lower, upper), cooldown in configs]
+    else:
+        ticks = [
+            tick for tick in read_ticks(path)
+            if (since is None or tick[0] >= since) and (until is None or tick[0] < until)
+        ]
+        tick_count = len(ticks)
+        span = (ticks[0][0], ticks[-1][0]) if ticks else None
+        results = [replay_engine(ticks, lower, upper, cooldown) for (lower, upper), cooldown in configs]
+    elapsed = time.perf_counter() - started
+
+    mismatches = []
+    if verify and np is not None:
+        ticks = list(zip(timestamps.tolist(), prices.tolist()))
+        for ((lower, upper), cooldown), result in zip(configs, results):
+            expected = replay_engine(ticks, lower, upper, cooldown)
+            if expected != result:
+                mismatches.append({'range': [lower, upper], 'cooldown': cooldown, 'expected': expected, 'got': result})
+
+    return {
+        'file': path,
+        'ticks': tick_count,
+        'span': span,
+        'seconds': elapsed,
+        'results': [
+            {'range': [lower, upper], 'cooldown': cooldown, **result}
+            for ((lower, upper), cooldown), result in zip(configs, results)
+        ],
+        'mismatches': mismatches,
+    }
+
+
+def print_report(report: dict):
+    span = report['span']
+    days = (span[1] - span[0]) / 86400 if span else 0
+    print(f"{report['file']}: {report['ticks']} ticks over {days:.2f} days, replayed in {report['seconds']:.2f}s")
+    print(f"  {'range':>24}  {'cooldown':>9}  {'alerts':>7}  {'episodes':>8}  {'outside':>8}")
+    for result in report['results']:
+        lower, upper = result['range']
+        label = f"{lower:g} - {'none' if upper is None else f'{upper:g}'}"
+        outside = result['outside_ticks'] / report['ticks'] * 100 if report['ticks'] else 0.0
+        print(f"  {label:>24}  {result['cooldown']:>8g}s  {result['alerts']:>7}  {result['episodes']:>8}  {outside:>7.2f}%")
+    for mismatch in report['mismatches']:
+        print(f"  MISMATCH {mismatch['range']} cooldown {mismatch['cooldown']}: "
+              f"engine {mismatch['expected']}, vectorized {mismatch['got']}", file=sys.stderr)
+
+
+def main():
+    args = parse_args()
+    if np is None:
+        print("NumPy is not installed; replaying through the alert engine, which is much slower.", file=sys.stderr)
+    configs = list(itertools.product(args.ranges, args.cooldowns or [300.0]))
+    reports = [replay_file(path, configs, args.since, args.until, args.verify) for path in args.tick_files]
+    for report in reports:
+        print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(reports, f, indent=2)
+    sys.exit(1 if any(report['mismatches'] for report in reports) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import random
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures. While open, calls are
+    rejected until a jittered, exponentially growing cool-off has passed; then one trial
+    call is let through (half-open). Success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 15,
+                 max_reset_timeout: float = 300, on_state_change=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.on_state_change = on_state_change # callable (breaker, old_state, new_state)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._open_count = 0 # Consecutive openings, drives the cool-off backoff
+        self._retry_at = 0.0
+        self._trial_running = False
+
+    def allow_request(self, now: float) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now >= self._retry_at:
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def release_trial(self):
+        """Gives up a half-open trial slot without a verdict, e.g. when the call was cancelled."""
+        self._trial_running = False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._trial_running = False
+        if self.state != CLOSED:
+            self._open_count = 0
+            self._transition(CLOSED)
+
+    def record_failure(self, now: float):
+        self.consecutive_failures += 1
+        if self.state == OPEN:
+            return # A request already in flight when the breaker opened; the cool-off stands
+        self._trial_running = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            # Wait at least half the cool-off so a jittered retry never hammers a dead endpoint
+            cool_off = min(self.max_reset_timeout, self.reset_timeout * (2 ** self._open_count))
+            self._retry_at = now + cool_off / 2 + backoff_delay(0, cool_off / 2, cool_off / 2)
+            self._open_count += 1
+            self._transition(OPEN)
+
+    def _transition(self, new_state: str):
+        old_state, self.state = self.state, new_state
+        logger.warning(f"Circuit breaker '{self.name}' {old_state} -> {new_state}.")
+        if self.on_state_change is not None:
+            self.on_state_change(self, old_state, new_state)
+
+
+class LatencyTracker:
+    """Latencies of the last `size` successful requests, for the hedging delay."""
+
+    __slots__ = ('samples', 'count', 'size')
+
+    def __init__(self, size: int = 200):
+        self.samples = array('d', bytes(8 * size))
+        self.count = 0
+        self.size = size
+
+    def add(self, seconds: float):
+        self.samples[self.count % self.size] = seconds
+        self.count += 1
+
+    def quantile(self, q: float):
+        """None until enough samples were recorded to make the estimate meaningful."""
+        filled = min(self.count, self.size)
+        if filled < 20:
+            return None
+        ordered = sorted(self.samples[:filled])
+        return ordered[min(filled - 1, int(q * filled))]
+
+
+class ResilientFetcher:
+    """
+    Wraps upstream calls with a per-endpoint circuit breaker, a strict per-request deadline,
+    retries with jittered exponential backoff and optional hedging: if a request has not
+    answered after the endpoint's p95 latency, a second identical one is sent and whichever
+    finishes first wins.
+    """
+
+    def __init__(self, timeout: float = 10, max_attempts: int = 2, backoff_base: float = 0.5,
+                 backoff_cap: float = 5, hedge: bool = False, on_state_change=None):
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge = hedge
+        self.on_state_change = on_state_change
+        self._breakers = {}  # endpoint -> CircuitBreaker
+        self._latencies = {} # endpoint -> LatencyTracker
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = CircuitBreaker(endpoint, on_state_change=self.on_state_change)
+            self._latencies[endpoint] = LatencyTracker()
+        return breaker
+
+    async def call(self, endpoint: str, request):
+        """
+        Runs `request` (a zero-argument coroutine function) against `endpoint`.
+        Raises CircuitOpenError without calling it while the endpoint's breaker is open,
+        otherwise the last error once every attempt failed.
+        """
+        breaker = self.breaker(endpoint)
+        latencies = self._latencies[endpoint]
+        for attempt in range(self.max_attempts):
+            if not breaker.allow_request(time.monotonic()):
+                raise CircuitOpenError(f"Circuit breaker for {endpoint} is {breaker.state}.")
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(self._hedged(request, latencies), self.timeout)
+            except asyncio.CancelledError:
+                breaker.release_trial()
+                raise
+            except Exception as e:
+                breaker.record_failure(time.monotonic())
+                if attempt + 1 >= self.max_attempts or breaker.state != CLOSED:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                logger.warning(f"Request to {endpoint} failed ({e!r}), retrying in {delay:.2f}s.")
+                await asyncio.sleep(delay)
+            else:
+                latencies.add(time.monotonic() - started)
+                breaker.record_success()
+                return result
+
+    async def _hedged(self, request, latencies: LatencyTracker):
+        hedge_delay = latencies.quantile(0.95) if self.hedge else None
+        if hedge_delay is None:
+            return await request()
+
+        tasks = [asyncio.ensure_future(request())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                tasks.append(asyncio.ensure_future(request()))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # Every request failed: surface the primary request's error
+            return tasks[0].result()
+        finally:
+            # Also runs when the deadline cancels us, so no request outlives it
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
@@ -0,0 +1,239 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import logging
+from collections import deque
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Lower values are delivered first
+PRIORITY_REPLY = 0    # Answers to commands, the user is waiting for them
+PRIORITY_ALERT = 1    # Price alerts
+PRIORITY_WARNING = 2  # Fetch error warnings
+
+# Telegram rejects messages longer than this; merged alerts are split below it
+MAX_MESSAGE_LENGTH = 4096
+MERGE_SEPARATOR = "\n\n"
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursting up to `capacity`."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0 # Set when Telegram asks us to back off
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+
+
+class DeliveryQueue:
+    """
+    Rate-limited outbound queue for Telegram messages.
+
+    Producers call `enqueue` and return immediately. A single dispatcher task hands chats
+    to senders in priority order, as allowed by a global token bucket (Telegram allows about
+    30 messages per second per bot) and one bucket per chat. Alerts that pile up for a chat
+    while it waits are merged into one message. A 429 puts the message back at the head of
+    its chat and pauses that chat for `retry_after`; only when several chats hit 429s within
+    FLOOD_WINDOW_SECONDS is every send paused, as the bot itself is then over the limit.
+    Nothing is dropped for rate-limit reasons.
+    """
+
+    # 429s from this many different chats within FLOOD_WINDOW_SECONDS pause delivery to all chats
+    GLOBAL_FLOOD_CHATS = 3
+    FLOOD_WINDOW_SECONDS = 5
+
+    def __init__(self, send, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 max_in_flight: int = 16, max_attempts: int = 5):
+        # send: async callable (chat_id, text)
+        self._send = send
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+
+        self._pending = {}       # chat id -> deque of [priority, text, attempts, mergeable]
+        self._chat_buckets = {}  # chat id -> TokenBucket
+        self._ready = []         # heap of (priority, sequence, chat id) for chats with something to send
+        self._queued = set()     # chat ids in _ready or waiting on their bucket
+        self._in_flight = set()  # chat ids with a send running, kept to one per chat to preserve order
+        self._sequence = itertools.count()
+        self._floods = deque()   # (time, chat id) of recent 429s, to tell a per-chat limit from a bot-wide one
+        self._global_bucket = None
+        self._wakeup = asyncio.Event()
+        self._slots = None
+        self._dispatcher = None
+        self._tasks = set()
+
+    def __len__(self):
+        return sum(len(messages) for messages in self._pending.values())
+
+    def enqueue(self, chat_id: int, text: str, priority: int = PRIORITY_REPLY):
+        """Queues a message for delivery. Never blocks."""
+        self._pending.setdefault(chat_id, deque()).append([priority, text, 0, True])
+        self._mark_ready(chat_id)
+
+    def _mark_ready(self, chat_id: int):
+        if chat_id in self._queued or chat_id in self._in_flight or not self._pending.get(chat_id):
+            return
+        self._queued.add(chat_id)
+        heapq.heappush(self._ready, (self._pending[chat_id][0][0], next(self._sequence), chat_id))
+        self._wakeup.set()
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._global_bucket = TokenBucket(self.global_rate, self.global_rate, loop.time())
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._dispatcher = asyncio.create_task(self._dispatch_loop(), name="telegram_delivery_queue")
+
+    async def stop(self, timeout: float = 10):
+        """Gives queued messages up to `timeout` seconds to go out, then stops the dispatcher."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (self._pending or self._tasks) and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        if self._pending:
+            logger.warning(f"Delivery queue stopped with {len(self)} undelivered message(s).")
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+    async def _dispatch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = loop.time()
+            global_wait = self._global_bucket.wait_time(now)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+            chat_wait = bucket.wait_time(now)
+            if chat_wait > 0:
+                # Come back to this chat once its bucket refills; other chats go first meanwhile
+                loop.call_later(chat_wait, self._requeue, chat_id)
+                continue
+
+            await self._slots.acquire()
+            self._global_bucket.consume(now)
+            bucket.consume(now)
+            self._queued.discard(chat_id)
+            self._in_flight.add(chat_id)
+            task = asyncio.create_task(self._deliver(chat_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _requeue(self, chat_id: int):
+        self._queued.discard(chat_id)
+        self._mark_ready(chat_id)
+
+    def _take_batch(self, chat_id: int) -> list:
+        """Pops the next message of a chat, merged with the alerts queued right behind it."""
+        messages = self._pending[chat_id]
+        batch = [messages.popleft()]
+        if batch[0][0] != PRIORITY_REPLY and batch[0][3]:
+            length = len(batch[0][1])
+            while messages and messages[0][0] != PRIORITY_REPLY and messages[0][3]:
+                length += len(MERGE_SEPARATOR) + len(messages[0][1])
+                if length > MAX_MESSAGE_LENGTH:
+                    break
+                batch.append(messages.popleft())
+        return batch
+
+    def _retry_later(self, chat_id: int, batch: list, error: Exception):
+        """Puts a failed batch back with exponential backoff, or drops it after `max_attempts`."""
+        attempts = batch[0][2] + 1
+        if attempts >= self.max_attempts:
+            logger.error(f"Giving up sending Telegram message to chat {chat_id} after {attempts} attempts: {error}")
+            return
+        logger.warning(f"Error sending Telegram message to chat {chat_id} (attempt {attempts}), retrying: {error}")
+        for message in batch:
+            message[2] = attempts
+        self._chat_buckets[chat_id].block(asyncio.get_running_loop().time() + 2 ** attempts)
+        self._pending[chat_id].extendleft(reversed(batch))
+
+    async def _deliver(self, chat_id: int):
+        loop = asyncio.get_running_loop()
+        batch = self._take_batch(chat_id)
+        text = MERGE_SEPARATOR.join(message[1] for message in batch)
+        try:
+            await self._send(chat_id, text)
+            if len(batch) > 1:
+                logger.info(f"Delivered {len(batch)} merged messages to chat {chat_id}.")
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if isinstance(retry_after, datetime.timedelta):
+                retry_after = retry_after.total_seconds()
+            now = loop.time()
+            self._chat_buckets[chat_id].block(now + retry_after)
+            self._pending[chat_id].extendleft(reversed(batch))
+            self._floods.append((now, chat_id))
+            while self._floods[0][0] < now - self.FLOOD_WINDOW_SECONDS:
+                self._floods.popleft()
+            if len({flooded for _, flooded in self._floods}) >= self.GLOBAL_FLOOD_CHATS:
+                logger.warning(f"Telegram flood limits hit for several chats, pausing all delivery for {retry_after}s.")
+                self._global_bucket.block(now + retry_after)
+            else:
+                logger.warning(f"Telegram flood limit hit for chat {chat_id}, pausing its delivery for {retry_after}s.")
+        except BadRequest as e:
+            if len(batch) > 1:
+                # One of the merged messages is invalid; send them one by one so only that one is lost
+                logger.warning(f"Telegram rejected {len(batch)} merged messages to chat {chat_id}, sending them separately: {e}")
+                for message in batch:
+                    message[3] = False
+                self._pending[chat_id].extendleft(reversed(batch))
+            else:
+                # The message is invalid; retrying cannot help
+                logger.error(f"Error sending Telegram message to chat {chat_id}: {e}")
+        except Forbidden as e:
+            # The chat blocked the bot; retrying cannot help
+            logger.error(f"Error sending Telegram message to chat {chat_id}: {e}")
+        except (TelegramError, OSError) as e:
+            self._retry_later(chat_id, batch, e)
+        except Exception as e:
+            # Not a Telegram failure, e.g. a bug in the send path; retried like one, so it is bounded
+            logger.exception(f"Unexpected error sending Telegram message to chat {chat_id}.")
+            self._retry_later(chat_id, batch, e)
+        finally:
+            self._slots.release()
+            self._in_flight.discard(chat_id)
+            if not self._pending[chat_id]:
+                del self._pending[chat_id]
+            else:
+                self._mark_ready(chat_id)
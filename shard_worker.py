@@ -0,0 +1,136 @@
+"""
+Shard worker: polls the pairs the front process assigns to it and sends alerts back.
+
+Started by the bot itself when SHARD_WORKERS is set, or separately (e.g. one container per
+worker) with SHARD_SOCKET pointing at the front's socket. All monitor settings come from the
+front; only METRICS_PORT/METRICS_HOST are read here for the worker's own metrics endpoint.
+"""
+import asyncio
+import logging
+import os
+import socket
+
+from metrics import MetricsRegistry, MetricsServer
+from monitor_store import MonitorConfig
+from price_monitor import PriceMonitor
+from sharding import STREAM_LIMIT, read_message, write_message
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class ShardWorker:
+    def __init__(self, socket_path: str, name: str, metrics_port: int = None, metrics_host: str = "127.0.0.1",
+                 token: str = None):
+        self.socket_path = socket_path
+        self.name = name
+        self.token = token
+        self.metrics = MetricsRegistry()
+        self.metrics_server = MetricsServer(self.metrics, metrics_host, metrics_port) if metrics_port else None
+        self.loop_lag = self.metrics.histogram(
+            "monitor_loop_lag_seconds", "Delay between the poll loop's planned and actual run time.")
+        self.monitor = None
+        self._writer = None
+
+    async def _connect(self):
+        """Connects to the front, retrying until it is up."""
+        while True:
+            try:
+                return await asyncio.open_unix_connection(self.socket_path, limit=STREAM_LIMIT)
+            except (FileNotFoundError, ConnectionError):
+                logger.info(f"Waiting for the front process on {self.socket_path}...")
+                await asyncio.sleep(1)
+
+    def _send(self, chat_id: int, text: str, priority: int):
+        write_message(self._writer, {"op": "notify", "chat_id": chat_id, "text": text, "priority": priority})
+
+    def _save(self, config: MonitorConfig):
+        write_message(self._writer, {
+            "op": "state",
+            "chat_id": config.chat_id,
+            "last_alert_time": config.last_alert_time,
+            "last_fetch_error_alert": config.last_fetch_error_alert,
+            "last_move_alert_time": config.last_move_alert_time,
+        })
+
+    def _create_monitor(self, settings: dict):
+        self.monitor = PriceMonitor(
+            settings["dexscreener_base_url"],
+            self.metrics,
+            self._send,
+            self._save,
+            batch_window=settings["batch_window"],
+            history_capacity=settings["history_capacity"],
+            history_windows=settings["history_windows"],
+            request_timeout=settings["request_timeout"],
+            hedge_requests=settings["hedge_requests"],
+            rpc_urls=settings["rpc_urls"],
+            tick_dir=settings["tick_dir"],
+        )
+        self.metrics.gauge("active_monitors", "Chats with an active monitor on this worker.", lambda: len(self.monitor))
+        self.metrics.gauge("watched_pairs", "Pairs polled by this worker.", lambda: self.monitor.watched_pairs)
+
+    async def _poll_loop(self, interval: float):
+        loop = asyncio.get_running_loop()
+        planned = loop.time()
+        while True:
+            self.loop_lag.observe(max(0.0, loop.time() - planned))
+            self.monitor.poll()
+            planned += interval
+            await asyncio.sleep(max(0.0, planned - loop.time()))
+
+    async def _handle(self, message: dict):
+        op = message["op"]
+        if op == "watch":
+            self.monitor.add(MonitorConfig(*message["config"]), stagger=message.get("stagger", False))
+        elif op == "unwatch":
+            self.monitor.remove(message["chat_id"])
+        elif op == "query":
+            if message["what"] == "interval":
+                result = await self.monitor.current_interval(message["chat_id"])
+            else:
+                result = await self.monitor.history(message["chat_id"], message["windows"], message["last_n"])
+            write_message(self._writer, {"op": "reply", "id": message["id"], "result": result})
+        else:
+            logger.warning(f"Unknown message {op!r} from the front process.")
+
+    async def run(self):
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+        reader, self._writer = await self._connect()
+        write_message(self._writer, {"op": "hello", "worker": self.name, "token": self.token})
+        setup = await read_message(reader)
+        if not setup or setup.get("op") != "setup":
+            logger.error("The front process did not send its settings; check that SHARD_TOKEN matches the bot's.")
+            return
+        self._create_monitor(setup)
+        logger.info(f"Shard worker {self.name} connected to {self.socket_path}.")
+
+        poll_task = asyncio.create_task(self._poll_loop(setup["batch_window"]), name="shard_poll_loop")
+        try:
+            while (message := await read_message(reader)) is not None:
+                await self._handle(message)
+            logger.warning("The front process closed the connection, stopping.")
+        finally:
+            poll_task.cancel()
+            await self.monitor.stop()
+            self._writer.close()
+            if self.metrics_server is not None:
+                await self.metrics_server.stop()
+
+
+if __name__ == "__main__":
+    SHARD_SOCKET = os.getenv("SHARD_SOCKET")
+    SHARD_WORKER_NAME = os.getenv("SHARD_WORKER_NAME") or f"{socket.gethostname()}-{os.getpid()}"
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) or None
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    SHARD_TOKEN = os.getenv("SHARD_TOKEN") # Must match the bot's
+
+    if not SHARD_SOCKET:
+        logger.error("SHARD_SOCKET environment variable not set.")
+        exit(1)
+
+    try:
+        asyncio.run(ShardWorker(SHARD_SOCKET, SHARD_WORKER_NAME, METRICS_PORT, METRICS_HOST, SHARD_TOKEN).run())
+    except KeyboardInterrupt:
+        pass
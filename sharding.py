@@ -0,0 +1,284 @@
+import asyncio
+import hmac
+import itertools
+import json
+import logging
+import os
+import secrets
+import socket
+import struct
+import sys
+
+from hash_ring import HashRing
+from price_feed import pair_key
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shard_worker.py")
+# History replies carry up to a few thousand samples; asyncio's default 64 KiB line limit is too small
+STREAM_LIMIT = 4 * 1024 * 1024
+
+
+async def read_message(reader: asyncio.StreamReader):
+    """Reads one newline-delimited JSON message, None once the peer closed the connection."""
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def write_message(writer: asyncio.StreamWriter, message: dict):
+    writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+
+def peer_uid(writer: asyncio.StreamWriter):
+    """User id of the process on the other end of a Unix socket, None where SO_PEERCRED is not available."""
+    sock = writer.get_extra_info("socket")
+    if sock is None or not hasattr(socket, "SO_PEERCRED"):
+        return None
+    _, uid, _ = struct.unpack("3i", sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")))
+    return uid
+
+
+class ShardedMonitor:
+    """
+    Front-process side of sharded mode, with the same interface as PriceMonitor.
+
+    Worker processes (shard_worker.py) connect over a Unix socket and each polls and evaluates
+    the pairs a consistent hash ring assigns to it. The front keeps every active config, sends
+    each worker the configs of its pairs and relays the workers' messages to `send` and their
+    alert state changes to `save`. When a worker connects or goes away, the pairs whose owner
+    changed move over with their configs, including cooldown state.
+
+    Workers can relay messages to any chat, so the socket is only accessible to its owner,
+    connections from other users are refused, and a worker's hello must carry `token`.
+    Without a configured token a random one is used, known only to the local workers.
+    """
+
+    def __init__(self, socket_path: str, send, save, worker_settings: dict, local_workers: int = 0,
+                 metrics_port: int = None, query_timeout: float = 5, token: str = None):
+        self.socket_path = socket_path
+        self.token = token or secrets.token_urlsafe(32)
+        self.send = send
+        self.save = save
+        self.worker_settings = worker_settings # Sent to every worker when it connects
+        self.local_workers = local_workers
+        self.metrics_port = metrics_port
+        self.query_timeout = query_timeout
+        self.ring = HashRing()
+        self._configs = {}     # chat id -> MonitorConfig of every active monitor
+        self._chat_keys = {}   # chat id -> (chain_id, pair_address)
+        self._key_chats = {}   # (chain_id, pair_address) -> set of chat ids
+        self._owners = {}      # (chain_id, pair_address) -> name of the worker polling it
+        self._workers = {}     # worker name -> StreamWriter
+        self._queries = {}     # request id -> Future awaiting the worker's reply
+        self._query_ids = itertools.count()
+        self._server = None
+        self._supervisors = []
+        self._stopping = False
+
+    def __len__(self):
+        return len(self._configs)
+
+    @property
+    def watched_pairs(self) -> int:
+        return len(self._key_chats)
+
+    def is_active(self, chat_id: int) -> bool:
+        return chat_id in self._configs
+
+    def key_for(self, chat_id: int):
+        return self._chat_keys.get(chat_id)
+
+    def poll(self):
+        """Polling happens in the workers."""
+
+    def add(self, config, stagger: bool = False):
+        """
+        Starts monitoring a chat's configured pair on the worker owning it, or applies its changed settings.
+        `stagger` spreads the first checks of monitors restored in bulk, see PriceMonitor.add.
+        """
+        key = pair_key(config.chain_id, config.pair_address)
+        previous_key = self._chat_keys.get(config.chat_id)
+        if previous_key is not None and previous_key != key:
+            self._detach(config.chat_id, previous_key)
+        self._configs[config.chat_id] = config
+        self._chat_keys[config.chat_id] = key
+        self._key_chats.setdefault(key, set()).add(config.chat_id)
+        owner = self._owners.get(key)
+        if owner is None:
+            owner = self.ring.node_for(key)
+            if owner is None:
+                logger.debug(f"No shard workers connected yet; chat {config.chat_id} is monitored once one connects.")
+                return
+            self._owners[key] = owner
+        self._write(owner, {"op": "watch", "config": config.as_row(), "stagger": stagger})
+
+    def remove(self, chat_id: int):
+        key = self._chat_keys.pop(chat_id, None)
+        self._configs.pop(chat_id, None)
+        if key is not None:
+            self._detach(chat_id, key)
+
+    def _detach(self, chat_id: int, key: tuple):
+        owner = self._owners.get(key)
+        if owner is not None:
+            self._write(owner, {"op": "unwatch", "chat_id": chat_id})
+        chats = self._key_chats.get(key)
+        if chats is not None:
+            chats.discard(chat_id)
+            if not chats:
+                del self._key_chats[key]
+                self._owners.pop(key, None)
+
+    def _write(self, worker: str, message: dict):
+        writer = self._workers.get(worker)
+        if writer is not None and not writer.is_closing():
+            write_message(writer, message)
+
+    def _rebalance(self):
+        """Moves every pair whose ring owner changed to its new worker."""
+        moved = 0
+        for key, chat_ids in self._key_chats.items():
+            owner = self.ring.node_for(key)
+            previous = self._owners.get(key)
+            if owner == previous:
+                continue
+            if previous is not None:
+                for chat_id in chat_ids:
+                    self._write(previous, {"op": "unwatch", "chat_id": chat_id})
+            if owner is None:
+                self._owners.pop(key, None)
+                continue
+            self._owners[key] = owner
+            # A connecting worker takes over many pairs at once; spread their first checks
+            for chat_id in chat_ids:
+                self._write(owner, {"op": "watch", "config": self._configs[chat_id].as_row(), "stagger": True})
+            moved += 1
+        logger.info(f"Rebalanced {moved} of {len(self._key_chats)} pair(s) across {len(self.ring)} shard worker(s).")
+
+    async def _query(self, chat_id: int, what: str, **params):
+        key = self._chat_keys.get(chat_id)
+        owner = self._owners.get(key) if key is not None else None
+        if owner not in self._workers:
+            return None
+        request_id = next(self._query_ids)
+        future = self._queries[request_id] = asyncio.get_running_loop().create_future()
+        self._write(owner, {"op": "query", "id": request_id, "what": what, "chat_id": chat_id, **params})
+        try:
+            return await asyncio.wait_for(future, self.query_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Shard worker {owner} did not answer a {what} query for chat {chat_id}.")
+            return None
+        finally:
+            self._queries.pop(request_id, None)
+
+    async def current_interval(self, chat_id: int):
+        return await self._query(chat_id, "interval")
+
+    async def history(self, chat_id: int, windows: dict, last_n: int):
+        return await self._query(chat_id, "history", windows=windows, last_n=last_n)
+
+    def _owns(self, worker: str, chat_id: int) -> bool:
+        # Messages a worker sent just before its pairs moved away are dropped
+        key = self._chat_keys.get(chat_id)
+        return key is not None and self._owners.get(key) == worker
+
+    def _handle_event(self, worker: str, message: dict):
+        op = message["op"]
+        if op == "reply":
+            future = self._queries.get(message["id"])
+            if future is not None and not future.done():
+                future.set_result(message["result"])
+        elif op == "notify":
+            if self._owns(worker, message["chat_id"]):
+                self.send(message["chat_id"], message["text"], message["priority"])
+        elif op == "state":
+            if self._owns(worker, message["chat_id"]):
+                config = self._configs[message["chat_id"]]
+                config.last_alert_time = message["last_alert_time"]
+                config.last_fetch_error_alert = message["last_fetch_error_alert"]
+                config.last_move_alert_time = message["last_move_alert_time"]
+                self.save(config)
+        else:
+            logger.warning(f"Unknown message {op!r} from shard worker {worker}.")
+
+    async def _handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        name = None
+        try:
+            uid = peer_uid(writer)
+            if uid is not None and uid != os.getuid():
+                logger.error(f"Refused a shard worker connection from user id {uid}.")
+                return
+            hello = await read_message(reader)
+            if not hello or hello.get("op") != "hello":
+                return
+            if not hmac.compare_digest(str(hello.get("token") or ""), self.token):
+                logger.error(f"Refused shard worker {hello.get('worker')!r}: wrong or missing SHARD_TOKEN.")
+                return
+            name = hello["worker"]
+            if name in self._workers:
+                logger.error(f"A shard worker named {name} is already connected, closing the new connection.")
+                name = None
+                return
+            self._workers[name] = writer
+            write_message(writer, {"op": "setup", **self.worker_settings})
+            self.ring.add(name)
+            logger.info(f"Shard worker {name} connected.")
+            self._rebalance()
+            while (message := await read_message(reader)) is not None:
+                self._handle_event(name, message)
+        except (ConnectionError, json.JSONDecodeError) as e:
+            logger.error(f"Connection to shard worker {name} failed: {e!r}")
+        finally:
+            if name is not None and self._workers.get(name) is writer:
+                del self._workers[name]
+                self.ring.remove(name)
+                logger.warning(f"Shard worker {name} disconnected.")
+                if not self._stopping:
+                    self._rebalance()
+            writer.close()
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path) # Left over from a previous run
+        # Created owner-only; nobody else may connect, even in a shared directory
+        umask = os.umask(0o177)
+        try:
+            self._server = await asyncio.start_unix_server(self._handle_worker, self.socket_path, limit=STREAM_LIMIT)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        logger.info(f"Waiting for shard workers on {self.socket_path}.")
+        for index in range(self.local_workers):
+            self._supervisors.append(asyncio.create_task(self._supervise(index), name=f"shard_worker_{index}"))
+
+    async def _supervise(self, index: int):
+        """Runs a local worker process and restarts it if it exits."""
+        env = dict(os.environ, SHARD_SOCKET=self.socket_path, SHARD_WORKER_NAME=f"local-{index}", SHARD_TOKEN=self.token)
+        if self.metrics_port:
+            env["METRICS_PORT"] = str(self.metrics_port + 1 + index)
+        while True:
+            process = await asyncio.create_subprocess_exec(sys.executable, WORKER_SCRIPT, env=env)
+            try:
+                code = await process.wait()
+            except asyncio.CancelledError:
+                if process.returncode is None:
+                    process.terminate()
+                    await process.wait()
+                raise
+            logger.error(f"Shard worker local-{index} exited with code {code}, restarting.")
+            await asyncio.sleep(1)
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._supervisors:
+            task.cancel()
+        await asyncio.gather(*self._supervisors, return_exceptions=True)
+        for writer in list(self._workers.values()):
+            writer.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
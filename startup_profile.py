@@ -0,0 +1,30 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    """
+    Wall-clock time of each startup phase, from `started` (a time.perf_counter() value taken
+    before the heavy imports) until the bot takes updates. `mark(phase)` closes the phase
+    that ran since the previous mark; `report` logs them all on one line.
+    """
+
+    def __init__(self, started: float = None):
+        self.started = time.perf_counter() if started is None else started
+        self._last = self.started
+        self.phases = [] # (phase, seconds) in order
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started
+
+    def report(self, detail: str = ""):
+        phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases)
+        logger.info(f"Ready after {self.total:.2f}s ({phases}){detail}.")
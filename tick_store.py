@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import os
+import re
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+# One tick is a little-endian (timestamp, price) pair of float64s, 16 bytes, appended in time order
+TICK_RECORD = struct.Struct('<dd')
+TICK_SUFFIX = ".ticks"
+
+
+def tick_path(directory: str, key: tuple) -> str:
+    """File of a (chain_id, pair_address) key, e.g. ticks/avalanche_0x8595....ticks."""
+    name = re.sub(r'[^a-z0-9]+', '_', f"{key[0]}_{key[1]}".lower())
+    return os.path.join(directory, name + TICK_SUFFIX)
+
+
+def read_ticks(path: str):
+    """Yields the (timestamp, price) ticks of a file without NumPy. A torn last record is ignored."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    usable = len(data) - len(data) % TICK_RECORD.size
+    yield from TICK_RECORD.iter_unpack(memoryview(data)[:usable])
+
+
+class TickRecorder:
+    """
+    Appends every evaluated price to a binary tick file per pair, for replay.py.
+
+    Ticks are buffered per pair on the event loop. `flush`, called from the monitor's poll job,
+    swaps the buffers out once `flush_seconds` have passed and appends them in a worker thread,
+    so the loop never waits on the disk. While writes keep failing, each pair keeps at most
+    `max_buffer_bytes`, dropping its oldest ticks. `close` waits for a write in progress and
+    writes everything still buffered.
+    """
+
+    def __init__(self, directory: str, flush_seconds: float = 5, max_buffer_bytes: int = 1 << 20):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        # Whole records only, so a trimmed buffer still starts on a tick boundary
+        self.max_buffer_bytes = max(TICK_RECORD.size, max_buffer_bytes - max_buffer_bytes % TICK_RECORD.size)
+        self._buffers = {} # (chain_id, pair_address) -> bytearray of packed ticks
+        self._dropping = set() # Pairs whose oldest ticks are being dropped, warned about once
+        self._last_flush = time.monotonic()
+        self._writing = None # Task appending the previously swapped out buffers
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, key: tuple, timestamp: float, price: float):
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = bytearray()
+        buffer += TICK_RECORD.pack(timestamp, price)
+        self._trim(key, buffer)
+
+    def flush(self):
+        """Starts appending the buffered ticks in a worker thread, at most every `flush_seconds`."""
+        if not self._buffers or time.monotonic() - self._last_flush < self.flush_seconds:
+            return
+        if self._writing is not None and not self._writing.done():
+            return # The disk is slow, the next call picks these ticks up too
+        self._last_flush = time.monotonic()
+        buffers, self._buffers = self._buffers, {}
+        self._writing = asyncio.create_task(self._write_in_thread(buffers), name="tick_flush")
+
+    def _trim(self, key: tuple, buffer: bytearray):
+        excess = len(buffer) - self.max_buffer_bytes
+        if excess <= 0:
+            return
+        del buffer[:excess]
+        if key not in self._dropping:
+            self._dropping.add(key)
+            logger.warning(f"Tick buffer of {key[1]} on {key[0]} is full, dropping its oldest ticks until a write succeeds.")
+
+    async def _write_in_thread(self, buffers: dict):
+        failed = await asyncio.to_thread(self._write, buffers)
+        for key, buffer in failed.items():
+            # Kept buffered ahead of the ticks recorded meanwhile, retried on the next flush
+            buffer += self._buffers.get(key, b"")
+            self._buffers[key] = buffer
+            self._trim(key, buffer)
+
+    def _write(self, buffers: dict) -> dict:
+        """Appends each pair's buffer to its file. Returns the buffers that could not be written."""
+        failed = {}
+        for key, buffer in buffers.items():
+            try:
+                with open(tick_path(self.directory, key), 'ab') as f:
+                    f.write(buffer)
+            except OSError as e:
+                logger.error(f"Could not write ticks of {key[1]} on {key[0]}: {e!r}")
+                failed[key] = buffer
+            else:
+                self._dropping.discard(key)
+        return failed
+
+    async def close(self):
+        if self._writing is not None:
+            await self._writing
+        buffers, self._buffers = self._buffers, {}
+        self._buffers = await asyncio.to_thread(self._write, buffers)
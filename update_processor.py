@@ -0,0 +1,56 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes up to `max_concurrent_updates` updates at once, but the updates of one chat
+    strictly one after another and in the order they arrived.
+
+    The /set* ConversationHandlers rely on a chat's updates being handled one by one (the
+    reply to "/setrange" must see the state "/setrange" left behind), so plain
+    concurrent_updates would break them. A slow command in one chat no longer holds up
+    every other chat, though.
+
+    The base class takes its semaphore before do_process_update runs, so a chat's queued
+    updates would hold pool slots while waiting for their own chat. It therefore gets an
+    unbounded limit, and the `concurrency_limit` slots are only taken once the chat's turn has come.
+    """
+
+    __slots__ = ('_chat_locks', '_slots', 'concurrency_limit')
+
+    # Passed to the base class, whose semaphore must never be the one updates wait on
+    UNBOUNDED = 2 ** 30
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(self.UNBOUNDED)
+        self.concurrency_limit = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._chat_locks = {} # chat id -> [asyncio.Lock, number of updates holding or waiting for it]
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._chat_locks.get(chat.id)
+        if entry is None:
+            entry = self._chat_locks[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[chat.id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass